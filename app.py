@@ -1,19 +1,409 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Blueprint, Response, current_app, g, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
+from flask.json.provider import DefaultJSONProvider
 from flask_pymongo import PyMongo
+from pymongo import ASCENDING, DESCENDING, TEXT, ReturnDocument
+from pymongo.errors import BulkWriteError
+from pymongo import UpdateOne, monitoring
+import click
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 from datetime import datetime, timedelta
 from bson import ObjectId
+from decimal import Decimal
+import json
+import math
 import os
-from functools import wraps
+import base64
+import csv
+import gzip
+import io
+import random
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import wraps, lru_cache
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = '3a8d7b9e5a65a15cf12fcb8db991c05ed720b7806b5468f0b52c1f6f3b2c36fa'
-app.config['MONGO_URI'] = 'mongodb://localhost:27017/travel_explorer'
+try:
+    import orjson
+except ImportError:  # Optional; falls back to the standard library encoder
+    orjson = None
 
-mongo = PyMongo(app)
-CORS(app)
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+try:
+    import redis
+except ImportError:  # Optional; only needed for RATE_LIMIT_STORAGE_URL
+    redis = None
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+# Configuration; deployment-specific settings are read from the environment
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', '3a8d7b9e5a65a15cf12fcb8db991c05ed720b7806b5468f0b52c1f6f3b2c36fa')
+    MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/travel_explorer')
+    # MongoDB connection pool, per worker process
+    MONGO_MAX_POOL_SIZE = _env_int('MONGO_MAX_POOL_SIZE', 100)
+    MONGO_MIN_POOL_SIZE = _env_int('MONGO_MIN_POOL_SIZE', 0)
+    MONGO_MAX_IDLE_TIME_MS = _env_int('MONGO_MAX_IDLE_TIME_MS', 60000)
+    MONGO_CONNECT_TIMEOUT_MS = _env_int('MONGO_CONNECT_TIMEOUT_MS', 5000)
+    MONGO_SOCKET_TIMEOUT_MS = _env_int('MONGO_SOCKET_TIMEOUT_MS', 30000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000)
+    MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+    ENSURE_INDEXES_ON_STARTUP = os.environ.get('ENSURE_INDEXES_ON_STARTUP', 'true').lower() == 'true'
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    SLOW_QUERY_MS = _env_int('SLOW_QUERY_MS', 100)  # 0 disables slow query logging
+    PAGE_SIZE_MAX = 500
+    STREAM_BATCH_SIZE = 500
+    BULK_BOOKING_MAX = 1000
+    MANIFEST_MAX_DAYS = 31
+    TIMESERIES_MAX_DAYS = 366
+    CURRENCY = os.environ.get('CURRENCY', 'INR')  # for packages without their own currency
+    COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies are sent as-is
+    GZIP_LEVEL = 6
+    BROTLI_QUALITY = 5  # for per-request compression; precompressed assets use the maximum
+    PACKAGE_CACHE_TTL = 60  # seconds
+    PACKAGE_CACHE_SIZE = 256
+    SEARCH_CACHE_SIZE = 1024  # search keys come from arbitrary query strings, so they get their own cache
+    PRINCIPAL_CACHE_TTL = 60  # seconds; bounds staleness of out-of-band user edits
+    PRINCIPAL_REVOCATION_POLL_INTERVAL = _env_int('PRINCIPAL_REVOCATION_POLL_INTERVAL', 2)  # seconds; cross-worker eviction delay
+    PRINCIPAL_CACHE_SIZE = 10000
+    TOKEN_CACHE_SIZE = 10000
+    STATS_RECONCILE_INTERVAL = 900  # seconds; 0 disables the background job
+    LIFECYCLE_SWEEP_INTERVAL = _env_int('LIFECYCLE_SWEEP_INTERVAL', 300)  # seconds; 0 disables the sweep
+    SWEEP_BATCH_SIZE = 500
+    JOB_WORKERS = _env_int('JOB_WORKERS', 2)  # 0 runs deferred jobs inline
+    SETTINGS_POLL_INTERVAL = _env_int('SETTINGS_POLL_INTERVAL', 5)  # seconds; used when change streams are unavailable
+    # Token buckets per endpoint and key: (burst capacity, seconds to refill it)
+    RATE_LIMITS = {
+        'login': {'ip': (20, 60), 'email': (5, 60)},
+        'register': {'ip': (5, 60), 'email': (3, 3600)},
+    }
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL')  # e.g. redis://localhost:6379/0; default is per process
+    # Werkzeug hash method incl. work factor, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = _env_int('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+
+mongo = PyMongo()
+cors = CORS()
+api = Blueprint('api', __name__, cli_group=None)
+
+# JSON provider with native ObjectId/datetime/Decimal support, so documents
+# straight from MongoDB can be returned without a per-document conversion pass
+def _json_default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, datetime):
+        # Naive datetimes in this app are UTC
+        return obj.isoformat() + ('+00:00' if obj.tzinfo is None else '')
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+class FastJSONProvider(DefaultJSONProvider):
+    if orjson:
+        _options = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        
+        def dumps_bytes(self, obj):
+            return orjson.dumps(obj, default=_json_default, option=self._options)
+        
+        def dumps(self, obj, **kwargs):
+            return self.dumps_bytes(obj).decode()
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+    else:
+        def dumps_bytes(self, obj):
+            return self.dumps(obj).encode()
+        
+        def dumps(self, obj, **kwargs):
+            return json.dumps(obj, default=_json_default, separators=(',', ':'))
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+# Thread-safe LRU cache whose entries expire after a TTL
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0  # Bumped on clear() so in-flight fills can detect invalidation
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key, value, ttl=None, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[1] if entry else None
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Serialized public catalog responses: key -> Representation. Searches are kept
+# apart so arbitrary query strings cannot evict the catalog itself.
+package_cache = TTLCache(Config.PACKAGE_CACHE_SIZE, Config.PACKAGE_CACHE_TTL)
+search_cache = TTLCache(Config.SEARCH_CACHE_SIZE, Config.PACKAGE_CACHE_TTL)
+
+def invalidate_catalog():
+    package_cache.clear()
+    search_cache.clear()
+
+# Authenticated principals by user_id, and decoded JWT payloads by token string
+principal_cache = TTLCache(Config.PRINCIPAL_CACHE_SIZE, Config.PRINCIPAL_CACHE_TTL)
+token_cache = TTLCache(Config.TOKEN_CACHE_SIZE, Config.PRINCIPAL_CACHE_TTL)
+
+def decode_token(token):
+    data = token_cache.get(token)
+    if data is None:
+        data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        # Never keep a token cached past its own expiry
+        ttl = token_cache.ttl
+        if 'exp' in data:
+            ttl = min(ttl, data['exp'] - time.time())
+        if ttl > 0:
+            token_cache.set(token, data, ttl=ttl)
+    return data
+
+def load_principal(user_id):
+    user = principal_cache.get(user_id)
+    if user is None:
+        user = mongo.db.users.find_one({'_id': ObjectId(user_id)}, {'password': 0})
+        if not user:
+            return None
+        principal_cache.set(user_id, user)
+    return dict(user)
+
+# Call whenever a user is deleted or their role changes so access checks see it
+# immediately in this worker. Other workers pick the revocation up on their next
+# poll (PRINCIPAL_REVOCATION_POLL_INTERVAL) via sync_principal_revocations.
+def invalidate_principal(user_id):
+    principal_cache.pop(str(user_id))
+    mongo.db.principal_revocations.insert_one({'user_id': str(user_id), 'revoked_at': datetime.utcnow()})
+
+_revocations_checked_at = None
+
+def sync_principal_revocations():
+    global _revocations_checked_at
+    now = datetime.utcnow()
+    if _revocations_checked_at is None:
+        # Nothing cached here can be older than the cache TTL
+        since = now - timedelta(seconds=current_app.config['PRINCIPAL_CACHE_TTL'])
+    else:
+        # Overlap the previous window to tolerate clock skew between hosts; evicting twice is harmless
+        since = _revocations_checked_at - timedelta(seconds=5)
+    for revocation in mongo.db.principal_revocations.find({'revoked_at': {'$gte': since}}, {'user_id': 1}):
+        principal_cache.pop(revocation['user_id'])
+    _revocations_checked_at = now
+
+# Password hashing runs in a bounded pool so bursts of logins queue instead of
+# saturating every request thread with key-derivation work
+# (created per process by create_app)
+password_pool = None
+
+def hash_password(password):
+    return password_pool.submit(
+        generate_password_hash, password, method=current_app.config['PASSWORD_HASH_METHOD']
+    ).result()
+
+def verify_password(password_hash, password):
+    return password_pool.submit(check_password_hash, password_hash, password).result()
+
+@lru_cache(maxsize=None)
+def _hash_parameters(method):
+    # Werkzeug fills in defaults (e.g. iterations), so read the canonical prefix off a real hash
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _hash_parameters(current_app.config['PASSWORD_HASH_METHOD'])
+
+# Prometheus-style metrics kept in process memory
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_COUNT_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100]
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, labels=(), value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, labels)} {value}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help_text, self.labels, self.buckets = name, help_text, labels, buckets
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+    
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._values.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {series[-2]}')
+                lines.append(f'{self.name}_count{_format_labels(self.labels, labels)} {series[-1]}')
+        return lines
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by route and status.', ('method', 'endpoint', 'status')
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'MongoDB commands issued per request.', ('endpoint',), QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in MongoDB per request.', ('endpoint',)
+)
+DB_COMMAND_LATENCY = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency.', ('command', 'collection')
+)
+DB_COMMAND_FAILURES = Counter('mongodb_command_failures_total', 'Failed MongoDB commands.', ('command',))
+DB_SLOW_COMMANDS = Counter('mongodb_slow_commands_total', 'MongoDB commands over SLOW_QUERY_MS.', ('command', 'collection'))
+JOBS_RUN = Counter('background_jobs_total', 'Background jobs run.', ('job', 'outcome'))
+RATE_LIMITED = Counter('http_rate_limited_total', 'Requests rejected by the rate limiter.', ('endpoint', 'scope'))
+
+# Per-request DB accounting; greenlet-local under the gevent server
+_request_db = threading.local()
+
+class DatabaseMonitor(monitoring.CommandListener):
+    """PyMongo command listener feeding DB metrics and the slow query log.
+    
+    Events fire on the thread that issued the command, so per-request totals
+    can be kept in a thread-local.
+    """
+    def __init__(self):
+        self.slow_ms = Config.SLOW_QUERY_MS
+        self.logger = None
+        self._inflight = {}
+    
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._inflight[event.request_id] = collection if isinstance(collection, str) else ''
+    
+    def _finished(self, event):
+        collection = self._inflight.pop(event.request_id, '')
+        seconds = event.duration_micros / 1e6
+        DB_COMMAND_LATENCY.observe((event.command_name, collection), seconds)
+        if getattr(_request_db, 'active', False):
+            _request_db.queries += 1
+            _request_db.seconds += seconds
+        if self.slow_ms and seconds * 1000 >= self.slow_ms:
+            DB_SLOW_COMMANDS.inc((event.command_name, collection))
+            if self.logger:
+                self.logger.warning(
+                    'Slow MongoDB %s on %s: %.1fms (%s)', event.command_name, collection or '-',
+                    seconds * 1000, getattr(_request_db, 'endpoint', 'no request')
+                )
+    
+    def succeeded(self, event):
+        self._finished(event)
+    
+    def failed(self, event):
+        self._finished(event)
+        DB_COMMAND_FAILURES.inc((event.command_name,))
+
+db_monitor = DatabaseMonitor()
+
+@api.before_app_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    _request_db.active = True
+    _request_db.queries = 0
+    _request_db.seconds = 0.0
+    _request_db.endpoint = request.path
+
+@api.after_app_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe((request.method, endpoint, str(response.status_code)), time.perf_counter() - started)
+        REQUEST_DB_QUERIES.observe((endpoint,), _request_db.queries)
+        REQUEST_DB_TIME.observe((endpoint,), _request_db.seconds)
+    _request_db.active = False
+    return response
+
+def render_metrics():
+    lines = []
+    for metric in (REQUEST_LATENCY, REQUEST_DB_QUERIES, REQUEST_DB_TIME,
+                   DB_COMMAND_LATENCY, DB_COMMAND_FAILURES, DB_SLOW_COMMANDS, RATE_LIMITED, JOBS_RUN):
+        lines.extend(metric.render())
+    caches = {'packages': package_cache, 'search': search_cache, 'principals': principal_cache, 'tokens': token_cache}
+    for field, kind in (('hits', 'counter'), ('misses', 'counter'), ('size', 'gauge')):
+        name = f"cache_{field}{'_total' if kind == 'counter' else ''}"
+        lines += [f'# HELP {name} Cache {field} by cache.', f'# TYPE {name} {kind}']
+        for cache_name, cache in caches.items():
+            lines.append(f'{name}{{cache="{cache_name}"}} {cache.stats()[field]}')
+    return '\n'.join(lines) + '\n'
 
 # JWT decorator
 def token_required(f):
@@ -28,8 +418,8 @@ def token_required(f):
             if token.startswith('Bearer '):
                 token = token.split(' ')[1]
             
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = mongo.db.users.find_one({'_id': ObjectId(data['user_id'])})
+            data = decode_token(token)
+            current_user = load_principal(data['user_id'])
             if not current_user:
                 return jsonify({'message': 'Invalid token'}), 401
         except jwt.ExpiredSignatureError:
@@ -53,22 +443,776 @@ def admin_required(f):
     
     return decorated
 
-# Helper function to convert ObjectId to string
-def serialize_doc(doc):
-    if doc and '_id' in doc:
-        doc['_id'] = str(doc['_id'])
-    return doc
+# Token-bucket rate limiting. Buckets live in this process by default; point
+# RATE_LIMIT_STORAGE_URL at Redis to share them between workers and hosts.
+class LocalBucketStore:
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+    
+    def consume(self, key, capacity, period):
+        """Take one token; return 0 if allowed, else the seconds until one is available."""
+        rate = capacity / period
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / rate
+
+class RedisBucketStore:
+    # Refill and take atomically on the server; idle buckets expire once full
+    SCRIPT = """
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local retry = 0
+    if tokens >= 1 then tokens = tokens - 1 else retry = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(retry)
+    """
+    
+    def __init__(self, url):
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+    
+    def consume(self, key, capacity, period):
+        return float(self._script(keys=[f'ratelimit:{key}'], args=[capacity, capacity / period, time.time()]))
+
+rate_limit_store = LocalBucketStore()
+
+def _rate_limit_key(scope):
+    if scope == 'ip':
+        return request.remote_addr
+    data = request.get_json(silent=True)
+    value = data.get(scope) if isinstance(data, dict) else None
+    return value.lower().strip() if isinstance(value, str) and value.strip() else None
+
+# Throttle a route by the limits configured for it in RATE_LIMITS
+def rate_limited(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        limits = current_app.config['RATE_LIMITS'].get(f.__name__)
+        if limits and current_app.config['RATE_LIMIT_ENABLED']:
+            for scope, (capacity, period) in limits.items():
+                key = _rate_limit_key(scope)
+                if key is None:
+                    continue
+                try:
+                    retry_after = rate_limit_store.consume(f'{f.__name__}:{scope}:{key}', capacity, period)
+                except Exception as e:
+                    # Fail open: an unreachable store must not lock everyone out
+                    current_app.logger.warning('Rate limit store unavailable: %s', e)
+                    break
+                # Stop at the first exhausted bucket so a blocked IP cannot drain a victim's email bucket
+                if retry_after:
+                    RATE_LIMITED.inc((f.__name__, scope))
+                    response = jsonify({'message': 'Too many requests, please try again later'})
+                    response.headers['Retry-After'] = str(math.ceil(retry_after))
+                    return response, 429
+        return f(*args, **kwargs)
+    
+    return decorated
+
+# Bookings reference users and packages by ObjectId
+def to_object_id(value):
+    """Parse a client-supplied reference; returns None if it is not a valid ObjectId."""
+    if isinstance(value, ObjectId):
+        return value
+    return ObjectId(value) if isinstance(value, str) and ObjectId.is_valid(value) else None
+
+def _refs(docs, field):
+    return list({doc[field] for doc in docs if doc.get(field)})
+
+# Join package (and optionally user) details onto bookings with one $in query per collection
+def attach_booking_details(bookings, include_user=False):
+    package_ids = _refs(bookings, 'package_id')
+    packages = {}
+    if package_ids:
+        for package in mongo.db.packages.find({'_id': {'$in': package_ids}}, {'name': 1, 'price': 1, 'image': 1}):
+            packages[package['_id']] = package
+    
+    users = {}
+    if include_user:
+        user_ids = _refs(bookings, 'user_id')
+        if user_ids:
+            for user in mongo.db.users.find({'_id': {'$in': user_ids}}, {'name': 1, 'email': 1}):
+                users[user['_id']] = user
+    
+    for booking in bookings:
+        # Package might have been deleted
+        package = packages.get(booking.get('package_id'))
+        if package:
+            booking['package'] = {
+                'name': package['name'],
+                'price': package['price'],
+                'image': package['image']
+            }
+        
+        if include_user:
+            user = users.get(booking.get('user_id'))
+            if user:
+                booking['user'] = {
+                    'name': user['name'],
+                    'email': user['email']
+                }
+        
+        format_booking_dates(booking)
+    
+    return bookings
+
+# Response compression (br/gzip, negotiated) and cache validators
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/csv', 'text/plain'}
+
+def negotiate_encoding():
+    if brotli and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress_body(body, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if best else current_app.config['BROTLI_QUALITY'])
+    return gzip.compress(body, compresslevel=9 if best else current_app.config['GZIP_LEVEL'])
+
+class Representation:
+    """A fixed response body with its validators and lazily built compressed variants."""
+    def __init__(self, body, mimetype, last_modified=None, precompress=False, etag=None):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag or hashlib.sha1(body).hexdigest()
+        self.last_modified = last_modified
+        self._best = precompress
+        self._variants = {None: body}
+        if precompress:
+            for encoding in ('gzip', 'br') if brotli else ('gzip',):
+                self._variants[encoding] = compress_body(body, encoding, best=True)
+    
+    def variant(self, encoding):
+        if encoding not in self._variants:
+            # Racing threads may both compress; the results are identical
+            self._variants[encoding] = compress_body(self.body, encoding, self._best)
+        return self._variants[encoding]
+    
+    def response(self):
+        encoding = negotiate_encoding() if len(self.body) >= current_app.config['COMPRESS_MIN_SIZE'] else None
+        response = Response(self.variant(encoding), mimetype=self.mimetype)
+        # Each encoding is a distinct representation, so it gets its own strong ETag
+        response.set_etag(f'{self.etag}-{encoding}' if encoding else self.etag)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if self.last_modified:
+            response.last_modified = self.last_modified
+        response.vary.add('Accept-Encoding')
+        return response.make_conditional(request)
+
+@api.after_app_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    encoding = negotiate_encoding() if len(body) >= current_app.config['COMPRESS_MIN_SIZE'] else None
+    if encoding:
+        response.set_data(compress_body(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+# Serve a JSON body from a catalog cache, building it on a miss; supports
+# If-None-Match / If-Modified-Since and reuses compressed variants across hits
+def cached_json_response(key, build, cache=package_cache):
+    entry = cache.get(key)
+    if entry is None:
+        generation = cache.generation
+        data = build()
+        if data is None:
+            return None
+        entry = Representation(
+            current_app.json.dumps_bytes(data), 'application/json',
+            last_modified=datetime.utcnow().replace(microsecond=0)
+        )
+        cache.set(key, entry, generation=generation)
+    
+    return entry.response()
+
+# Keyset pagination over (created_at, _id), newest first
+PAGE_SORT = [('created_at', -1), ('_id', -1)]
 
-def serialize_docs(docs):
-    return [serialize_doc(doc) for doc in docs]
+def encode_cursor(doc):
+    created_at = doc.get('created_at')
+    raw = f"{created_at.isoformat() if created_at else ''}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        created_at, _id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        _id = ObjectId(_id)
+        created_at = datetime.fromisoformat(created_at) if created_at else None
+    except Exception:
+        raise ValueError('Invalid cursor')
+    
+    if created_at is None:
+        # Documents without created_at sort last, so only smaller ids among them remain
+        return {'created_at': None, '_id': {'$lt': _id}}
+    return {'$or': [
+        {'created_at': {'$lt': created_at}},
+        {'created_at': created_at, '_id': {'$lt': _id}},
+        {'created_at': None}
+    ]}
+
+def wants_page():
+    return 'limit' in request.args or 'after' in request.args
+
+def fetch_page(collection, query, projection=None):
+    """Return (docs, next_cursor) for the ?limit=&after= page of a collection."""
+    try:
+        limit = int(request.args.get('limit', current_app.config['PAGE_SIZE_MAX']))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    limit = min(limit, current_app.config['PAGE_SIZE_MAX'])
+    
+    if request.args.get('after'):
+        query = {'$and': [query, decode_cursor(request.args['after'])]}
+    
+    # Fetch one extra document to know whether another page exists
+    docs = list(collection.find(query, projection).sort(PAGE_SORT).limit(limit + 1))
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+def page_response(docs, next_cursor):
+    return jsonify({'data': docs, 'next_cursor': next_cursor})
+
+# Streaming export: NDJSON lines or a chunked JSON array, never holding the full result
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json-stream': 'application/json'
+}
+
+def iter_batches(cursor, size):
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def stream_docs(cursor, fmt, transform=None):
+    cursor = cursor.batch_size(current_app.config['STREAM_BATCH_SIZE'])
+    
+    def generate():
+        first = True
+        if fmt == 'json-stream':
+            yield '['
+        # One chunk per batch keeps the number of socket writes low
+        for batch in iter_batches(cursor, current_app.config['STREAM_BATCH_SIZE']):
+            if transform:
+                batch = transform(batch)
+            if fmt == 'ndjson':
+                yield ''.join(current_app.json.dumps(doc) + '\n' for doc in batch)
+            else:
+                yield ('' if first else ',') + ','.join(current_app.json.dumps(doc) for doc in batch)
+            first = False
+        if fmt == 'json-stream':
+            yield ']'
+    
+    return Response(stream_with_context(generate()), mimetype=STREAM_FORMATS[fmt])
+
+def wants_stream():
+    return request.args.get('format') in STREAM_FORMATS
+
+# Package search: text match plus price/discount filters, with facet counts
+PRICE_BUCKETS = [0, 500, 1000, 1500, 2000, 5000]
+DISCOUNT_BANDS = [0, 10, 20, 30, 50, 101]
+SEARCH_SORTS = {
+    'price_asc': [('price', ASCENDING), ('_id', ASCENDING)],
+    'price_desc': [('price', DESCENDING), ('_id', ASCENDING)],
+    'discount': [('discount', DESCENDING), ('_id', ASCENDING)],
+    'newest': PAGE_SORT
+}
+
+def _range_filter(field, low, high, cast):
+    bounds = {}
+    try:
+        if request.args.get(low):
+            bounds['$gte'] = cast(request.args[low])
+        if request.args.get(high):
+            bounds['$lte'] = cast(request.args[high])
+    except ValueError:
+        raise ValueError(f'{low}/{high} must be numbers')
+    return {field: bounds} if bounds else {}
+
+def _bucket_facet(field, boundaries):
+    return [{'$bucket': {
+        'groupBy': f'${field}',
+        'boundaries': boundaries,
+        'default': 'other',
+        'output': {'count': {'$sum': 1}}
+    }}]
+
+def _bucket_counts(buckets, boundaries):
+    counts = {bucket['_id']: bucket['count'] for bucket in buckets}
+    facets = [
+        {'min': low, 'max': high, 'count': counts.get(low, 0)}
+        for low, high in zip(boundaries, boundaries[1:])
+    ]
+    if counts.get('other'):
+        facets.append({'min': boundaries[-1], 'max': None, 'count': counts['other']})
+    return facets
+
+def search_packages():
+    query = request.args.get('q', '').strip()
+    sort = request.args.get('sort', 'relevance' if query else 'newest')
+    if sort not in SEARCH_SORTS and not (sort == 'relevance' and query):
+        raise ValueError(f"sort must be one of: {', '.join(['relevance', *SEARCH_SORTS])}")
+    try:
+        limit = min(int(request.args.get('limit', 20)), current_app.config['PAGE_SIZE_MAX'])
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    
+    match = {}
+    if query:
+        match['$text'] = {'$search': query}
+    match.update(_range_filter('price', 'min_price', 'max_price', float))
+    match.update(_range_filter('discount', 'min_discount', 'max_discount', float))
+    
+    if sort == 'relevance':
+        results = [{'$sort': {'score': {'$meta': 'textScore'}, '_id': 1}}]
+    else:
+        results = [{'$sort': dict(SEARCH_SORTS[sort])}]
+    results.append({'$limit': limit})
+    if query:
+        results.append({'$addFields': {'score': {'$meta': 'textScore'}}})
+    
+    facets = next(mongo.db.packages.aggregate([
+        {'$match': match},
+        {'$facet': {
+            'results': results,
+            'total': [{'$count': 'count'}],
+            'price': _bucket_facet('price', PRICE_BUCKETS),
+            'discount': _bucket_facet('discount', DISCOUNT_BANDS)
+        }}
+    ]))
+    
+    return {
+        'results': facets['results'],
+        'total': facets['total'][0]['count'] if facets['total'] else 0,
+        'facets': {
+            'price': _bucket_counts(facets['price'], PRICE_BUCKETS),
+            'discount': _bucket_counts(facets['discount'], DISCOUNT_BANDS)
+        }
+    }
+
+# Materialized admin statistics, kept current with $inc on every write path
+STATS_ID = 'global'
+
+def bump_stats(changes):
+    changes = {k: v for k, v in changes.items() if v}
+    if changes:
+        # No upsert: only reconcile_stats creates the document, from a full count,
+        # so a write landing before the first reconcile cannot leave a partial one
+        mongo.db.admin_stats.update_one({'_id': STATS_ID}, {'$inc': changes})
+
+# Stats delta for a booking moving between statuses (None means created/deleted)
+def booking_stats_delta(booking, old_status, new_status):
+    changes = {}
+    if old_status:
+        changes[f'bookingStats.{old_status}'] = -1
+    if new_status:
+        changes[f'bookingStats.{new_status}'] = changes.get(f'bookingStats.{new_status}', 0) + 1
+    if old_status is None:
+        changes['totalBookings'] = 1
+    if new_status is None:
+        changes['totalBookings'] = -1
+    
+    # Revenue counts completed bookings at the price captured when they were made
+    if (old_status == 'completed') != (new_status == 'completed'):
+        price = booking.get('price') or 0
+        changes['totalRevenue'] = price if new_status == 'completed' else -price
+    return changes
+
+# Daily rollups: revenue, bookings and guests per package per day, kept in step
+# with admin_stats so charts never scan bookings. Bookings and guests count on
+# the day the booking was made; revenue on the day it completed, so past days
+# stay fixed once their bookings have completed.
+def rollup_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+# Bookings completed before completed_at was recorded fall back to their last update
+def completion_time(booking):
+    return booking.get('completed_at') or booking.get('updated_at') or booking['created_at']
+
+def add_rollup_delta(deltas, booking, bookings=0, revenue=0):
+    def entry(when):
+        key = (booking.get('package_id'), rollup_day(when))
+        return deltas.setdefault(key, {'revenue': 0, 'bookings': 0, 'guests': 0})
+    
+    if bookings:
+        delta = entry(booking['created_at'])
+        delta['bookings'] += bookings
+        delta['guests'] += bookings * (booking.get('guests') or 0)
+    if revenue:
+        entry(completion_time(booking))['revenue'] += revenue
+
+def bump_rollups(deltas):
+    updates = [
+        UpdateOne({'date': day, 'package_id': package_id},
+                  {'$inc': delta}, upsert=True)
+        for (package_id, day), delta in deltas.items() if any(delta.values())
+    ]
+    if updates:
+        mongo.db.daily_rollups.bulk_write(updates, ordered=False)
+
+# Rollup delta for a booking moving between statuses (None means created/deleted)
+def booking_rollup_delta(booking, old_status, new_status):
+    deltas = {}
+    revenue = booking_stats_delta(booking, old_status, new_status).get('totalRevenue', 0)
+    count = 1 if old_status is None else (-1 if new_status is None else 0)
+    add_rollup_delta(deltas, booking, bookings=count, revenue=revenue)
+    return deltas
+
+def compute_stats():
+    """Recompute every admin statistic from scratch with full aggregations."""
+    total_users = mongo.db.users.count_documents({})
+    total_bookings = mongo.db.bookings.count_documents({})
+    active_packages = mongo.db.packages.count_documents({})
+    
+    # Calculate total revenue from completed bookings at their booked price
+    pipeline = [
+        {'$match': {'status': 'completed'}},
+        {'$group': {
+            '_id': None,
+            'total_revenue': {'$sum': '$price'}
+        }}
+    ]
+    
+    revenue_result = list(mongo.db.bookings.aggregate(pipeline))
+    total_revenue = revenue_result[0]['total_revenue'] if revenue_result else 0
+    
+    # Get recent booking counts by status
+    booking_stats = list(mongo.db.bookings.aggregate([
+        {'$group': {
+            '_id': '$status',
+            'count': {'$sum': 1}
+        }}
+    ]))
+    
+    status_counts = {item['_id']: item['count'] for item in booking_stats}
+    
+    return {
+        'totalUsers': total_users,
+        'totalBookings': total_bookings,
+        'activePackages': active_packages,
+        'totalRevenue': total_revenue,
+        'bookingStats': status_counts
+    }
+
+def _stats_view(doc):
+    return {
+        'totalUsers': doc.get('totalUsers', 0),
+        'totalBookings': doc.get('totalBookings', 0),
+        'activePackages': doc.get('activePackages', 0),
+        'totalRevenue': doc.get('totalRevenue', 0),
+        'bookingStats': {k: v for k, v in doc.get('bookingStats', {}).items() if v}
+    }
+
+def _stats_drift(stored, actual):
+    drift = {}
+    for key in ('totalUsers', 'totalBookings', 'activePackages', 'totalRevenue'):
+        if stored[key] != actual[key]:
+            drift[key] = actual[key] - stored[key]
+    for status in set(stored['bookingStats']) | set(actual['bookingStats']):
+        diff = actual['bookingStats'].get(status, 0) - stored['bookingStats'].get(status, 0)
+        if diff:
+            drift[f'bookingStats.{status}'] = diff
+    return drift
+
+def rebuild_rollups():
+    """Rebuild daily_rollups from bookings; returns (prices backfilled, rollup documents).
+    
+    Bookings made before prices were captured first take their package's current price.
+    """
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+    packages = {package['_id']: package for package in mongo.db.packages.find({}, {'price': 1, 'currency': 1})}
+    backfilled = 0
+    cursor = mongo.db.bookings.find({'price': {'$exists': False}}, {'package_id': 1}).batch_size(batch_size)
+    for batch in iter_batches(cursor, batch_size):
+        updates = []
+        for booking in batch:
+            package = packages.get(booking.get('package_id')) or {}
+            updates.append(UpdateOne({'_id': booking['_id'], 'price': {'$exists': False}}, {'$set': {
+                'price': package.get('price', 0),
+                'currency': package.get('currency') or current_app.config['CURRENCY']
+            }}))
+        backfilled += mongo.db.bookings.bulk_write(updates, ordered=False).modified_count
+    
+    deltas = {}
+    cursor = mongo.db.bookings.find({}, {field: 1 for field in [
+        'package_id', 'guests', 'price', 'status', 'created_at', 'completed_at', 'updated_at'
+    ]})
+    for booking in cursor.batch_size(batch_size):
+        revenue = (booking.get('price') or 0) if booking.get('status') == 'completed' else 0
+        add_rollup_delta(deltas, booking, bookings=1, revenue=revenue)
+    
+    rollups = [dict(delta, date=day, package_id=package_id) for (package_id, day), delta in deltas.items()]
+    mongo.db.daily_rollups.delete_many({})
+    if rollups:
+        mongo.db.daily_rollups.insert_many(rollups)
+    return backfilled, len(rollups)
+
+def reconcile_stats():
+    """Rebuild the admin_stats document from scratch and return the drift that was corrected."""
+    actual = compute_stats()
+    stored = mongo.db.admin_stats.find_one({'_id': STATS_ID})
+    drift = _stats_drift(_stats_view(stored), actual) if stored else {}
+    mongo.db.admin_stats.replace_one(
+        {'_id': STATS_ID},
+        dict(actual, reconciled_at=datetime.utcnow()),
+        upsert=True
+    )
+    if drift:
+        current_app.logger.warning('Admin stats drift corrected: %s', drift)
+    return drift
+
+# In-process background jobs: side-effects deferred out of the request path, and
+# periodic maintenance. Jobs are not persisted; anything lost with the process
+# (a stats bump, a notification) is repaired by the next reconcile or sweep.
+class JobQueue:
+    def __init__(self):
+        self._executor = None
+        self._periodic = []
+        self._lock = threading.Lock()
+        self._scheduler_started = False
+    
+    def configure(self, workers):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job') if workers else None
+        self._periodic = []
+    
+    def _run(self, app, fn, args):
+        with app.app_context():
+            try:
+                fn(*args)
+                JOBS_RUN.inc((fn.__name__, 'ok'))
+            except Exception as e:
+                JOBS_RUN.inc((fn.__name__, 'error'))
+                app.logger.error('Background job %s failed: %s', fn.__name__, e)
+    
+    def enqueue(self, fn, *args):
+        app = current_app._get_current_object()
+        if self._executor is None:
+            return self._run(app, fn, args)
+        self._executor.submit(self._run, app, fn, args)
+    
+    def schedule(self, fn, interval):
+        if interval:
+            self._periodic.append((fn, interval))
+    
+    def _run_scheduler(self, app):
+        due = {fn: time.monotonic() + interval for fn, interval in self._periodic}
+        while True:
+            time.sleep(max(0, min(due.values()) - time.monotonic()))
+            now = time.monotonic()
+            for fn, interval in self._periodic:
+                if due[fn] <= now:
+                    due[fn] = now + interval
+                    if self._executor is None:
+                        self._run(app, fn, ())
+                    else:
+                        self._executor.submit(self._run, app, fn, ())
+    
+    def start_scheduler(self, app):
+        if self._scheduler_started or not self._periodic:
+            return
+        with self._lock:
+            if not self._scheduler_started:
+                threading.Thread(target=self._run_scheduler, args=(app,), daemon=True).start()
+                self._scheduler_started = True
+
+jobs = JobQueue()
+
+# Started lazily from the first request so the thread lives in the serving process
+@api.before_app_request
+def start_scheduler():
+    jobs.start_scheduler(current_app._get_current_object())
+
+def notify_booking_event(bookings, status):
+    """Tell each booking's owner about its new status (logged; no mail transport is configured)."""
+    users = mongo.db.users.find({'_id': {'$in': _refs(bookings, 'user_id')}}, {'email': 1})
+    emails = {user['_id']: user['email'] for user in users}
+    for booking in bookings:
+        email = emails.get(booking.get('user_id'))
+        if email:
+            current_app.logger.info('Notify %s: booking %s (%s) is %s',
+                                    email, booking['_id'], booking.get('destination'), status)
+
+# Deferred side-effects of a booking changing status (None means created/deleted)
+def record_booking_change(booking, old_status, new_status):
+    bump_stats(booking_stats_delta(booking, old_status, new_status))
+    bump_rollups(booking_rollup_delta(booking, old_status, new_status))
+    if new_status:
+        notify_booking_event([booking], new_status)
+
+def record_bookings_created(bookings):
+    bump_stats({'totalBookings': len(bookings), 'bookingStats.pending': len(bookings)})
+    deltas = {}
+    for booking in bookings:
+        add_rollup_delta(deltas, booking, bookings=1)
+    bump_rollups(deltas)
+    notify_booking_event(bookings, 'pending')
+
+SWEEP_PROJECTION = {field: 1 for field in [
+    'package_id', 'user_id', 'destination', 'guests', 'price', 'created_at', 'completed_at'
+]}
+
+def complete_past_bookings():
+    """Move confirmed bookings whose check-out has passed to completed; returns how many moved."""
+    batch_size = current_app.config['SWEEP_BATCH_SIZE']
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    completed = 0
+    while True:
+        batch = list(mongo.db.bookings.find(
+            {'status': 'confirmed', 'check_out': {'$lte': today}},
+            SWEEP_PROJECTION
+        ).limit(batch_size))
+        if not batch:
+            break
+        
+        now = datetime.utcnow()
+        ids = [booking['_id'] for booking in batch]
+        result = mongo.db.bookings.update_many(
+            {'_id': {'$in': ids}, 'status': 'confirmed'},
+            {'$set': {'status': 'completed', 'completed_at': now, 'updated_at': now}}
+        )
+        if not result.modified_count:
+            break
+        if result.modified_count < len(batch):
+            # Some changed under us (e.g. cancelled, or another worker's sweep); count only ours
+            batch = list(mongo.db.bookings.find(
+                {'_id': {'$in': ids}, 'completed_at': now},
+                SWEEP_PROJECTION
+            ))
+        
+        deltas = {}
+        for booking in batch:
+            add_rollup_delta(deltas, dict(booking, completed_at=now), revenue=booking.get('price') or 0)
+        bump_stats({
+            'bookingStats.confirmed': -len(batch),
+            'bookingStats.completed': len(batch),
+            'totalRevenue': sum(booking.get('price') or 0 for booking in batch)
+        })
+        bump_rollups(deltas)
+        notify_booking_event(batch, 'completed')
+        completed += len(batch)
+    
+    if completed:
+        current_app.logger.info('Lifecycle sweep completed %s bookings', completed)
+    return completed
+
+# Site settings are read on every admin page load but change rarely. Each process
+# keeps the current document and its rendered body; a watcher thread reloads it when
+# the document changes, via a change stream on replica sets or by polling the version.
+class SettingsCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._watcher_started = False
+        self.version = None
+        self.representation = None
+    
+    def store(self, doc):
+        doc = doc or {}
+        version = doc.get('version', 0)
+        representation = Representation(
+            current_app.json.dumps_bytes(doc), 'application/json',
+            last_modified=doc.get('updated_at') or doc.get('created_at'),
+            etag=f'settings-v{version}'
+        )
+        with self._lock:
+            self.version, self.representation, self._loaded = version, representation, True
+    
+    def refresh(self):
+        self.store(mongo.db.settings.find_one({}))
+    
+    def get(self):
+        if not self._loaded:
+            self.refresh()
+        return self.representation
+    
+    def _poll(self, app, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    doc = mongo.db.settings.find_one({}, {'version': 1}) or {}
+                    if doc.get('version', 0) != self.version:
+                        self.refresh()
+            except Exception as e:
+                app.logger.error('Settings poll failed: %s', e)
+    
+    def _watch(self, app, interval):
+        while True:
+            opened = False
+            try:
+                with app.app_context():
+                    with mongo.db.settings.watch() as stream:
+                        opened = True
+                        # Pick up anything written before the stream was opened
+                        self.refresh()
+                        for _ in stream:
+                            self.refresh()
+            except Exception as e:
+                if not opened:
+                    app.logger.info('Settings change stream unavailable (%s); polling every %ss', e, interval)
+                    return self._poll(app, interval)
+                app.logger.warning('Settings change stream interrupted: %s', e)
+                time.sleep(interval)
+    
+    def start_watcher(self, app):
+        interval = app.config['SETTINGS_POLL_INTERVAL']
+        if self._watcher_started or not interval:
+            return
+        with self._lock:
+            if not self._watcher_started:
+                threading.Thread(target=self._watch, args=(app, interval), daemon=True).start()
+                self._watcher_started = True
+
+settings_cache = SettingsCache()
+
+# Started lazily for the same reason as the stats reconciler
+@api.before_app_request
+def start_settings_watcher():
+    settings_cache.start_watcher(current_app._get_current_object())
 
 # Routes
-@app.route('/')
+@api.route('/')
 def index():
-    return render_template('kayal.html')
+    # Rendered and compressed once per process by create_app
+    return current_app.extensions['index_page'].response()
 
 # Authentication Routes
-@app.route('/api/auth/register', methods=['POST'])
+@api.route('/api/auth/register', methods=['POST'])
+@rate_limited
 def register():
     try:
         data = request.get_json()
@@ -98,19 +1242,21 @@ def register():
         user = {
             'name': data['name'].strip(),
             'email': data['email'].lower().strip(),
-            'password': generate_password_hash(data['password']),
+            'password': hash_password(data['password']),
             'role': 'user',
             'created_at': datetime.utcnow()
         }
         
         result = mongo.db.users.insert_one(user)
+        bump_stats({'totalUsers': 1})
         
         return jsonify({'message': 'User created successfully', 'user_id': str(result.inserted_id)}), 201
     
     except Exception as e:
         return jsonify({'message': 'Registration failed', 'error': str(e)}), 500
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
+@rate_limited
 def login():
     try:
         data = request.get_json()
@@ -123,13 +1269,20 @@ def login():
         
         user = mongo.db.users.find_one({'email': data['email'].lower().strip()})
         
-        if not user or not check_password_hash(user['password'], data['password']):
+        if not user or not verify_password(user['password'], data['password']):
             return jsonify({'message': 'Invalid email or password'}), 401
         
+        # Transparently upgrade hashes stored under older parameters
+        if needs_rehash(user['password']):
+            mongo.db.users.update_one(
+                {'_id': user['_id'], 'password': user['password']},
+                {'$set': {'password': hash_password(data['password'])}}
+            )
+        
         token = jwt.encode({
             'user_id': str(user['_id']),
             'exp': datetime.utcnow() + timedelta(days=7) 
-        }, app.config['SECRET_KEY'], algorithm='HS256')
+        }, current_app.config['SECRET_KEY'], algorithm='HS256')
         
         return jsonify({
             'token': token,
@@ -144,7 +1297,7 @@ def login():
     except Exception as e:
         return jsonify({'message': 'Login failed', 'error': str(e)}), 500
 
-@app.route('/api/auth/verify', methods=['GET'])
+@api.route('/api/auth/verify', methods=['GET'])
 @token_required
 def verify_token(current_user):
     return jsonify({
@@ -157,15 +1310,34 @@ def verify_token(current_user):
     }), 200
 
 # Package Routes
-@app.route('/api/packages', methods=['GET'])
+@api.route('/api/packages', methods=['GET'])
 def get_packages():
     try:
-        packages = list(mongo.db.packages.find())
-        return jsonify(serialize_docs(packages)), 200
+        if wants_stream():
+            return stream_docs(mongo.db.packages.find().sort(PAGE_SORT), request.args['format'])
+        
+        if wants_page():
+            packages, next_cursor = fetch_page(mongo.db.packages, {})
+            return page_response(packages, next_cursor), 200
+        
+        return cached_json_response(('list',), lambda: list(mongo.db.packages.find()))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Failed to fetch packages', 'error': str(e)}), 500
 
-@app.route('/api/packages', methods=['POST'])
+@api.route('/api/packages/search', methods=['GET'])
+def search_packages_route():
+    try:
+        # Catalog writes clear the search cache along with the package cache
+        key = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+        return cached_json_response(key, search_packages, cache=search_cache)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': 'Failed to search packages', 'error': str(e)}), 500
+
+@api.route('/api/packages', methods=['POST'])
 @token_required
 @admin_required
 def create_package(current_user):
@@ -188,30 +1360,40 @@ def create_package(current_user):
             'discount': int(data['discount']),
             'image': data['image'],
             'features': data['features'] if isinstance(data['features'], list) else [],
+            'capacity': parse_capacity(data.get('capacity')),  # Seats per day; None means unlimited
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
         
         result = mongo.db.packages.insert_one(package)
+        invalidate_catalog()
+        bump_stats({'activePackages': 1})
         package['_id'] = str(result.inserted_id)
         
         return jsonify(package), 201
     
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Failed to create package', 'error': str(e)}), 500
 
-@app.route('/api/packages/<package_id>', methods=['GET'])
+@api.route('/api/packages/<package_id>', methods=['GET'])
 def get_package(package_id):
     try:
-        package = mongo.db.packages.find_one({'_id': ObjectId(package_id)})
-        if not package:
+        # Never let a malformed id reach the cache, where it could match another entry
+        if not ObjectId.is_valid(package_id):
+            return jsonify({'message': 'Package not found'}), 404
+        response = cached_json_response(
+            ('package', package_id), lambda: mongo.db.packages.find_one({'_id': ObjectId(package_id)})
+        )
+        if response is None:
             return jsonify({'message': 'Package not found'}), 404
         
-        return jsonify(serialize_doc(package)), 200
+        return response
     except Exception as e:
         return jsonify({'message': 'Failed to fetch package', 'error': str(e)}), 500
 
-@app.route('/api/packages/<package_id>', methods=['PUT'])
+@api.route('/api/packages/<package_id>', methods=['PUT'])
 @token_required
 @admin_required
 def update_package(current_user, package_id):
@@ -235,40 +1417,268 @@ def update_package(current_user, package_id):
         
         # Remove None values
         update_data = {k: v for k, v in update_data.items() if v is not None}
+        if 'capacity' in data:
+            # Seats per day; an explicit null removes the limit
+            update_data['capacity'] = parse_capacity(data['capacity'])
         
-        result = mongo.db.packages.update_one(
+        previous = mongo.db.packages.find_one_and_update(
             {'_id': ObjectId(package_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={'capacity': 1},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count == 0:
+        if previous is None:
             return jsonify({'message': 'Package not found'}), 404
+        invalidate_catalog()
+        
+        if 'capacity' in update_data:
+            apply_capacity_change(previous['_id'], previous.get('capacity'), update_data['capacity'])
         
         # Get updated package
         package = mongo.db.packages.find_one({'_id': ObjectId(package_id)})
         
-        return jsonify(serialize_doc(package)), 200
+        return jsonify(package), 200
     
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Failed to update package', 'error': str(e)}), 500
 
-@app.route('/api/packages/<package_id>', methods=['DELETE'])
+@api.route('/api/packages/<package_id>', methods=['DELETE'])
 @token_required
 @admin_required
 def delete_package(current_user, package_id):
     try:
-        result = mongo.db.packages.delete_one({'_id': ObjectId(package_id)})
+        package = mongo.db.packages.find_one_and_delete({'_id': ObjectId(package_id)}, projection={'_id': 1})
         
-        if result.deleted_count == 0:
+        if package is None:
             return jsonify({'message': 'Package not found'}), 404
+        invalidate_catalog()
+        mongo.db.availability.delete_many({'package_id': package['_id']})
+        # Its bookings keep their booked price, so revenue is unaffected
+        bump_stats({'activePackages': -1})
         
         return jsonify({'message': 'Package deleted successfully'}), 200
     
     except Exception as e:
         return jsonify({'message': 'Failed to delete package', 'error': str(e)}), 500
 
+# Seat inventory: one availability document per package per night holding the
+# remaining seats, decremented atomically so concurrent bookings cannot oversell
+def parse_capacity(value):
+    if value is None or value == '':
+        return None
+    try:
+        capacity = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('capacity must be an integer')
+    if capacity < 0:
+        raise ValueError('capacity cannot be negative')
+    return capacity
+
+# Travel dates are stored as BSON dates (midnight UTC) and exchanged with
+# clients as YYYY-MM-DD strings
+BOOKING_DATE_FORMAT = '%Y-%m-%d'
+BOOKING_DATE_FIELDS = ('check_in', 'check_out')
+
+def parse_booking_date(value):
+    # Documents written before migrate-booking-dates still hold strings
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, BOOKING_DATE_FORMAT)
+
+def format_booking_dates(booking):
+    for field in BOOKING_DATE_FIELDS:
+        if isinstance(booking.get(field), datetime):
+            booking[field] = booking[field].strftime(BOOKING_DATE_FORMAT)
+    return booking
+
+def booking_nights(booking):
+    check_in = parse_booking_date(booking['check_in'])
+    check_out = parse_booking_date(booking['check_out'])
+    return [check_in + timedelta(days=n) for n in range((check_out - check_in).days)]
+
+def ensure_availability(package_id, nights, capacity):
+    """Create any missing day buckets for the nights at full capacity."""
+    try:
+        mongo.db.availability.bulk_write([
+            UpdateOne({'package_id': package_id, 'date': night}, {'$setOnInsert': {'remaining': capacity}}, upsert=True)
+            for night in nights
+        ], ordered=False)
+    except BulkWriteError as e:
+        # A concurrent request created the same bucket first; anything else is real
+        if any(err['code'] != 11000 for err in e.details.get('writeErrors', [])):
+            raise
+
+def seed_availability(package_id, capacity):
+    """Charge a newly limited package with the bookings taken while it was unlimited.
+    
+    Only bookings that never held seats are counted, so anything booked through
+    reserve_seats after the limit was set is not charged twice. A package that
+    is already oversold ends up with negative remaining seats and takes no more.
+    """
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    bookings = list(mongo.db.bookings.find(
+        {
+            'package_id': package_id,
+            'status': {'$ne': 'cancelled'},
+            'seats_reserved': {'$ne': True},
+            'check_out': {'$gt': today}
+        },
+        {'check_in': 1, 'check_out': 1, 'guests': 1}
+    ))
+    held = {}
+    for booking in bookings:
+        for night in booking_nights(booking):
+            if night >= today:
+                held[night] = held.get(night, 0) + booking['guests']
+    if not held:
+        return
+    
+    ensure_availability(package_id, list(held), capacity)
+    mongo.db.availability.bulk_write([
+        UpdateOne({'package_id': package_id, 'date': night}, {'$inc': {'remaining': -guests}})
+        for night, guests in held.items()
+    ], ordered=False)
+    # Cancelling them now hands their seats back
+    mongo.db.bookings.update_many(
+        {'_id': {'$in': [booking['_id'] for booking in bookings]}},
+        {'$set': {'seats_reserved': True}}
+    )
+
+def apply_capacity_change(package_id, old_capacity, new_capacity):
+    if new_capacity is None:
+        # Unlimited again: drop the buckets; no booking holds seats any more
+        mongo.db.availability.delete_many({'package_id': package_id})
+        mongo.db.bookings.update_many(
+            {'package_id': package_id, 'seats_reserved': True},
+            {'$set': {'seats_reserved': False}}
+        )
+    elif old_capacity is None:
+        seed_availability(package_id, new_capacity)
+    elif new_capacity != old_capacity:
+        # Shift every existing day bucket by the capacity change
+        mongo.db.availability.update_many(
+            {'package_id': package_id},
+            {'$inc': {'remaining': new_capacity - old_capacity}}
+        )
+
+def release_seats(package_id, nights, guests):
+    if nights:
+        mongo.db.availability.update_many(
+            {'package_id': package_id, 'date': {'$in': nights}},
+            {'$inc': {'remaining': guests}}
+        )
+
+def reserve_seats(booking, packages=None):
+    """Reserve the booking's seats on every night; returns False if any night is full.
+    
+    Sets booking['seats_reserved'] so release only happens for bookings that held seats.
+    packages is the memo filled by build_booking, which saves re-reading the package.
+    """
+    booking['seats_reserved'] = False
+    package_id = booking.get('package_id')
+    if not package_id:
+        return True
+    if packages is None or package_id not in packages:
+        packages = {package_id: mongo.db.packages.find_one({'_id': package_id}, {'capacity': 1})}
+    capacity = (packages[package_id] or {}).get('capacity')
+    if capacity is None:
+        return True
+    
+    nights = booking_nights(booking)
+    ensure_availability(package_id, nights, capacity)
+    
+    reserved = []
+    try:
+        for night in nights:
+            result = mongo.db.availability.update_one(
+                {'package_id': package_id, 'date': night, 'remaining': {'$gte': booking['guests']}},
+                {'$inc': {'remaining': -booking['guests']}}
+            )
+            if result.modified_count == 0:
+                release_seats(package_id, reserved, booking['guests'])
+                return False
+            reserved.append(night)
+    except Exception:
+        # Hand back the nights taken so far before surfacing the error
+        release_seats(package_id, reserved, booking['guests'])
+        raise
+    
+    booking['seats_reserved'] = True
+    return True
+
+def release_booking_seats(booking):
+    if booking.get('seats_reserved'):
+        release_seats(booking['package_id'], booking_nights(booking), booking['guests'])
+
 # Booking Routes
-@app.route('/api/bookings', methods=['POST'])
+# Validate a booking payload; returns (booking, None) or (None, error message).
+# packages memoizes package lookups across the items of a bulk request.
+def build_booking(data, current_user, packages=None):
+    if not isinstance(data, dict):
+        return None, 'Booking must be an object'
+    
+    # Validate required fields
+    required_fields = ['destination', 'guests', 'check_in', 'check_out']
+    for field in required_fields:
+        if field not in data or not data[field]:
+            return None, f'{field} is required'
+    
+    # Validate dates
+    try:
+        check_in = datetime.strptime(data['check_in'], BOOKING_DATE_FORMAT)
+        check_out = datetime.strptime(data['check_out'], BOOKING_DATE_FORMAT)
+        
+        if check_in >= check_out:
+            return None, 'Check-out date must be after check-in date'
+        
+        if check_in < datetime.now().replace(hour=0, minute=0, second=0, microsecond=0):
+            return None, 'Check-in date cannot be in the past'
+            
+    except (TypeError, ValueError):
+        return None, 'Invalid date format. Use YYYY-MM-DD'
+    
+    try:
+        guests = int(data['guests'])
+    except (TypeError, ValueError):
+        return None, 'guests must be an integer'
+    if guests < 1:
+        # A negative count would hand seats back in reserve_seats
+        return None, 'guests must be a positive integer'
+    
+    package_id, package = None, {}  # Optional for custom bookings
+    if data.get('package_id'):
+        package_id = to_object_id(data['package_id'])
+        if package_id is None:
+            return None, 'Invalid package_id'
+        packages = {} if packages is None else packages
+        if package_id not in packages:
+            packages[package_id] = mongo.db.packages.find_one(
+                {'_id': package_id}, {'price': 1, 'currency': 1, 'capacity': 1}
+            )
+        package = packages[package_id]
+        if package is None:
+            return None, 'Package not found'
+    
+    booking = {
+        'user_id': current_user['_id'],
+        'package_id': package_id,
+        'destination': data['destination'],
+        'guests': guests,
+        # Price as booked; later package edits do not change it
+        'price': package.get('price', 0),
+        'currency': package.get('currency') or current_app.config['CURRENCY'],
+        'check_in': check_in,
+        'check_out': check_out,
+        'status': 'pending',
+        'created_at': datetime.utcnow(),
+        'updated_at': datetime.utcnow()
+    }
+    return booking, None
+
+@api.route('/api/bookings', methods=['POST'])
 @token_required
 def create_booking(current_user):
     try:
@@ -277,94 +1687,120 @@ def create_booking(current_user):
         if not data:
             return jsonify({'message': 'No data provided'}), 400
         
-        # Validate required fields
-        required_fields = ['destination', 'guests', 'check_in', 'check_out']
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({'message': f'{field} is required'}), 400
+        packages = {}
+        booking, error = build_booking(data, current_user, packages)
+        if error:
+            return jsonify({'message': error}), 400
         
-        # Validate dates
-        try:
-            check_in = datetime.strptime(data['check_in'], '%Y-%m-%d')
-            check_out = datetime.strptime(data['check_out'], '%Y-%m-%d')
-            
-            if check_in >= check_out:
-                return jsonify({'message': 'Check-out date must be after check-in date'}), 400
-            
-            if check_in < datetime.now().replace(hour=0, minute=0, second=0, microsecond=0):
-                return jsonify({'message': 'Check-in date cannot be in the past'}), 400
-                
-        except ValueError:
-            return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
-        
-        booking = {
-            'user_id': str(current_user['_id']),
-            'package_id': data.get('package_id'),  # Optional for custom bookings
-            'destination': data['destination'],
-            'guests': int(data['guests']),
-            'check_in': data['check_in'],
-            'check_out': data['check_out'],
-            'status': 'pending',
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
+        if not reserve_seats(booking, packages):
+            return jsonify({'message': 'Not enough availability for the selected dates'}), 409
         
-        result = mongo.db.bookings.insert_one(booking)
+        try:
+            result = mongo.db.bookings.insert_one(booking)
+        except Exception:
+            release_booking_seats(booking)
+            raise
         booking['_id'] = str(result.inserted_id)
+        jobs.enqueue(record_booking_change, dict(booking), None, booking['status'])
         
-        return jsonify(booking), 201
+        return jsonify(format_booking_dates(booking)), 201
     
     except Exception as e:
         return jsonify({'message': 'Failed to create booking', 'error': str(e)}), 500
 
-@app.route('/api/bookings', methods=['GET'])
+@api.route('/api/bookings/bulk', methods=['POST'])
+@token_required
+def create_bookings_bulk(current_user):
+    try:
+        data = request.get_json()
+        items = data.get('bookings') if isinstance(data, dict) else data
+        
+        if not items or not isinstance(items, list):
+            return jsonify({'message': 'A non-empty list of bookings is required'}), 400
+        
+        if len(items) > current_app.config['BULK_BOOKING_MAX']:
+            return jsonify({'message': f"At most {current_app.config['BULK_BOOKING_MAX']} bookings per request"}), 400
+        
+        # Validate every item up front; only valid ones are written
+        results = [None] * len(items)
+        bookings, positions, packages = [], [], {}
+        failed_writes = {}
+        try:
+            for index, item in enumerate(items):
+                booking, error = build_booking(item, current_user, packages)
+                if not error and not reserve_seats(booking, packages):
+                    error = 'Not enough availability for the selected dates'
+                if error:
+                    results[index] = {'index': index, 'status': 'error', 'message': error}
+                else:
+                    bookings.append(booking)
+                    positions.append(index)
+            
+            if bookings:
+                try:
+                    mongo.db.bookings.insert_many(bookings, ordered=False)
+                except BulkWriteError as e:
+                    failed_writes = {err['index']: err['errmsg'] for err in e.details.get('writeErrors', [])}
+        except Exception:
+            # Nothing was reported as created; give back every seat taken so far
+            for booking in bookings:
+                release_booking_seats(booking)
+            raise
+        
+        created = []
+        for offset, (index, booking) in enumerate(zip(positions, bookings)):
+            if offset in failed_writes:
+                release_booking_seats(booking)
+                results[index] = {'index': index, 'status': 'error', 'message': failed_writes[offset]}
+            else:
+                created.append(booking)
+                results[index] = {'index': index, 'status': 'created', '_id': str(booking['_id'])}
+        
+        if created:
+            jobs.enqueue(record_bookings_created, created)
+        
+        failed = len(items) - len(created)
+        status_code = 201 if not failed else (207 if created else 400)
+        return jsonify({'created': len(created), 'failed': failed, 'results': results}), status_code
+    
+    except Exception as e:
+        return jsonify({'message': 'Failed to create bookings', 'error': str(e)}), 500
+
+@api.route('/api/bookings', methods=['GET'])
 @token_required
 def get_bookings(current_user):
     try:
-        user_id = str(current_user['_id'])
+        is_admin = current_user.get('role') == 'admin'
         
         # If admin and requesting all bookings
-        if current_user.get('role') == 'admin' and request.args.get('all') == 'true':
-            bookings = list(mongo.db.bookings.find().sort('created_at', -1))
+        if is_admin and request.args.get('all') == 'true':
+            query = {}
         else:
             # Regular users can only see their own bookings
-            bookings = list(mongo.db.bookings.find({'user_id': user_id}).sort('created_at', -1))
+            query = {'user_id': current_user['_id']}
+        # Optional travel-date window: trips starting between from and to (inclusive)
+        query.update(date_range_filter('check_in'))
         
-        # Add package details and user details for admin
-        for booking in bookings:
-            booking['_id'] = str(booking['_id'])
-            
-            # Add package details if available
-            if booking.get('package_id'):
-                try:
-                    package = mongo.db.packages.find_one({'_id': ObjectId(booking['package_id'])})
-                    if package:
-                        booking['package'] = {
-                            'name': package['name'],
-                            'price': package['price'],
-                            'image': package['image']
-                        }
-                except:
-                    pass  # Package might have been deleted
-            
-            # Add user details for admin view
-            if current_user.get('role') == 'admin':
-                try:
-                    user = mongo.db.users.find_one({'_id': ObjectId(booking['user_id'])})
-                    if user:
-                        booking['user'] = {
-                            'name': user['name'],
-                            'email': user['email']
-                        }
-                except:
-                    pass
+        def enrich(batch):
+            return attach_booking_details(batch, include_user=is_admin)
+        
+        if wants_stream():
+            return stream_docs(mongo.db.bookings.find(query).sort(PAGE_SORT), request.args['format'], enrich)
+        
+        if wants_page():
+            bookings, next_cursor = fetch_page(mongo.db.bookings, query)
+            return page_response(enrich(bookings), next_cursor), 200
         
-        return jsonify(bookings), 200
+        bookings = list(mongo.db.bookings.find(query).sort('created_at', -1))
+        
+        return jsonify(enrich(bookings)), 200
     
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Failed to fetch bookings', 'error': str(e)}), 500
 
-@app.route('/api/bookings/<booking_id>', methods=['GET'])
+@api.route('/api/bookings/<booking_id>', methods=['GET'])
 @token_required
 def get_booking(current_user, booking_id):
     try:
@@ -374,15 +1810,46 @@ def get_booking(current_user, booking_id):
             return jsonify({'message': 'Booking not found'}), 404
         
         # Check if user owns this booking or is admin
-        if str(booking['user_id']) != str(current_user['_id']) and current_user.get('role') != 'admin':
+        if booking['user_id'] != current_user['_id'] and current_user.get('role') != 'admin':
             return jsonify({'message': 'Access denied'}), 403
         
-        return jsonify(serialize_doc(booking)), 200
+        return jsonify(format_booking_dates(booking)), 200
     
     except Exception as e:
         return jsonify({'message': 'Failed to fetch booking', 'error': str(e)}), 500
 
-@app.route('/api/bookings/<booking_id>', methods=['PATCH'])
+# Booking lifecycle: pending -> confirmed -> completed, and any live booking can be cancelled
+BOOKING_TRANSITIONS = {
+    'pending': ['confirmed', 'cancelled'],
+    'confirmed': ['completed', 'cancelled'],
+    'completed': ['cancelled'],
+    'cancelled': []
+}
+BOOKING_ALLOWED_FROM = {
+    status: [old for old, targets in BOOKING_TRANSITIONS.items() if status in targets]
+    for status in BOOKING_TRANSITIONS
+}
+
+# Filter matching a booking the current user may act on
+def booking_filter(booking_id, current_user):
+    query = {'_id': ObjectId(booking_id)}
+    if current_user.get('role') != 'admin':
+        query['user_id'] = current_user['_id']
+    return query
+
+# Explain why a conditional write matched nothing; only runs on the failure path
+def booking_write_failure(booking_id, current_user, status=None):
+    booking = mongo.db.bookings.find_one({'_id': ObjectId(booking_id)}, {'user_id': 1, 'status': 1})
+    if not booking:
+        return jsonify({'message': 'Booking not found'}), 404
+    if current_user.get('role') != 'admin' and booking['user_id'] != current_user['_id']:
+        return jsonify({'message': 'Access denied'}), 403
+    if status is None:
+        # Deletes have no status guard, so the booking was removed concurrently
+        return jsonify({'message': 'Booking not found'}), 404
+    return jsonify({'message': f"Cannot change a {booking.get('status')} booking to {status}"}), 409
+
+@api.route('/api/bookings/<booking_id>', methods=['PATCH'])
 @token_required
 def update_booking_status(current_user, booking_id):
     try:
@@ -391,49 +1858,57 @@ def update_booking_status(current_user, booking_id):
         if not data or 'status' not in data:
             return jsonify({'message': 'Status is required'}), 400
         
-        booking = mongo.db.bookings.find_one({'_id': ObjectId(booking_id)})
-        if not booking:
-            return jsonify({'message': 'Booking not found'}), 404
+        if data['status'] not in BOOKING_TRANSITIONS:
+            return jsonify({'message': f'Invalid status. Must be one of: {", ".join(BOOKING_TRANSITIONS)}'}), 400
         
         # Only admin can update booking status, or user can cancel their own booking
-        if current_user.get('role') != 'admin':
-            if str(booking['user_id']) != str(current_user['_id']):
-                return jsonify({'message': 'Access denied'}), 403
-            if data['status'] not in ['cancelled']:
-                return jsonify({'message': 'Users can only cancel their own bookings'}), 403
-        
-        valid_statuses = ['pending', 'confirmed', 'completed', 'cancelled']
-        if data['status'] not in valid_statuses:
-            return jsonify({'message': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'}), 400
-        
-        # Update booking status
-        mongo.db.bookings.update_one(
-            {'_id': ObjectId(booking_id)},
-            {'$set': {
-                'status': data['status'],
-                'updated_at': datetime.utcnow()
-            }}
+        if current_user.get('role') != 'admin' and data['status'] != 'cancelled':
+            return jsonify({'message': 'Users can only cancel their own bookings'}), 403
+        
+        # Ownership and the allowed transition are part of the filter, so a
+        # concurrent change makes this match nothing instead of being overwritten
+        query = booking_filter(booking_id, current_user)
+        query['status'] = {'$in': BOOKING_ALLOWED_FROM[data['status']]}
+        updates = {
+            'status': data['status'],
+            'updated_at': datetime.utcnow()
+        }
+        if data['status'] == 'cancelled':
+            updates['seats_reserved'] = False
+        elif data['status'] == 'completed':
+            # Same field the lifecycle sweep sets; revenue is dated by it
+            updates['completed_at'] = updates['updated_at']
+        
+        # The previous version tells us what to release and how stats change
+        booking = mongo.db.bookings.find_one_and_update(
+            query,
+            {'$set': updates},
+            return_document=ReturnDocument.BEFORE
         )
+        if booking is None:
+            return booking_write_failure(booking_id, current_user, data['status'])
         
-        return jsonify({'message': 'Booking status updated successfully'}), 200
+        if data['status'] == 'cancelled':
+            release_booking_seats(booking)
+        updated = dict(booking, **updates)
+        jobs.enqueue(record_booking_change, updated, booking['status'], data['status'])
+        
+        return jsonify(format_booking_dates(dict(updated))), 200
     
     except Exception as e:
         return jsonify({'message': 'Failed to update booking', 'error': str(e)}), 500
 
-@app.route('/api/bookings/<booking_id>', methods=['DELETE'])
+@api.route('/api/bookings/<booking_id>', methods=['DELETE'])
 @token_required
 def delete_booking(current_user, booking_id):
     try:
-        booking = mongo.db.bookings.find_one({'_id': ObjectId(booking_id)})
-        
-        if not booking:
-            return jsonify({'message': 'Booking not found'}), 404
-        
         # Only admin or booking owner can delete
-        if current_user.get('role') != 'admin' and str(booking['user_id']) != str(current_user['_id']):
-            return jsonify({'message': 'Access denied'}), 403
+        booking = mongo.db.bookings.find_one_and_delete(booking_filter(booking_id, current_user))
+        if booking is None:
+            return booking_write_failure(booking_id, current_user)
         
-        mongo.db.bookings.delete_one({'_id': ObjectId(booking_id)})
+        release_booking_seats(booking)
+        jobs.enqueue(record_booking_change, booking, booking.get('status'), None)
         
         return jsonify({'message': 'Booking deleted successfully'}), 200
     
@@ -441,19 +1916,28 @@ def delete_booking(current_user, booking_id):
         return jsonify({'message': 'Failed to delete booking', 'error': str(e)}), 500
 
 # User Management Routes (Admin only)
-@app.route('/api/users', methods=['GET'])
+@api.route('/api/users', methods=['GET'])
 @token_required
 @admin_required
 def get_users(current_user):
     try:
+        if wants_stream():
+            return stream_docs(mongo.db.users.find({}, {'password': 0}).sort(PAGE_SORT), request.args['format'])
+        
+        if wants_page():
+            users, next_cursor = fetch_page(mongo.db.users, {}, {'password': 0})
+            return page_response(users, next_cursor), 200
+        
         users = list(mongo.db.users.find({}, {'password': 0}).sort('created_at', -1))  # Exclude password
         
-        return jsonify(serialize_docs(users)), 200
+        return jsonify(users), 200
     
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Failed to fetch users', 'error': str(e)}), 500
 
-@app.route('/api/users/<user_id>', methods=['GET'])
+@api.route('/api/users/<user_id>', methods=['GET'])
 @token_required
 @admin_required
 def get_user(current_user, user_id):
@@ -463,12 +1947,12 @@ def get_user(current_user, user_id):
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
-        return jsonify(serialize_doc(user)), 200
+        return jsonify(user), 200
     
     except Exception as e:
         return jsonify({'message': 'Failed to fetch user', 'error': str(e)}), 500
 
-@app.route('/api/users/<user_id>', methods=['DELETE'])
+@api.route('/api/users/<user_id>', methods=['DELETE'])
 @token_required
 @admin_required
 def delete_user(current_user, user_id):
@@ -481,9 +1965,11 @@ def delete_user(current_user, user_id):
         
         if result.deleted_count == 0:
             return jsonify({'message': 'User not found'}), 404
+        invalidate_principal(user_id)
+        bump_stats({'totalUsers': -1})
         
         # Also delete user's bookings (optional - you might want to keep them for records)
-        # mongo.db.bookings.delete_many({'user_id': user_id})
+        # mongo.db.bookings.delete_many({'user_id': ObjectId(user_id)})
         
         return jsonify({'message': 'User deleted successfully'}), 200
     
@@ -491,72 +1977,232 @@ def delete_user(current_user, user_id):
         return jsonify({'message': 'Failed to delete user', 'error': str(e)}), 500
 
 # Admin Statistics
-@app.route('/api/admin/stats', methods=['GET'])
+@api.route('/api/admin/stats', methods=['GET'])
 @token_required
 @admin_required
 def get_admin_stats(current_user):
     try:
-        # Get basic counts
-        total_users = mongo.db.users.count_documents({})
-        total_bookings = mongo.db.bookings.count_documents({})
-        active_packages = mongo.db.packages.count_documents({})
-        
-        # Calculate total revenue from completed bookings with package info
-        pipeline = [
-            {'$match': {'status': 'completed', 'package_id': {'$exists': True, '$ne': None}}},
-            {'$addFields': {
-                'package_oid': {'$toObjectId': '$package_id'}
-            }},
-            {'$lookup': {
-                'from': 'packages',
-                'localField': 'package_oid',
-                'foreignField': '_id',
-                'as': 'package_info'
-            }},
-            {'$unwind': '$package_info'},
-            {'$group': {
-                '_id': None,
-                'total_revenue': {'$sum': '$package_info.price'}
-            }}
-        ]
-        
-        revenue_result = list(mongo.db.bookings.aggregate(pipeline))
-        total_revenue = revenue_result[0]['total_revenue'] if revenue_result else 0
+        stats = mongo.db.admin_stats.find_one({'_id': STATS_ID})
+        if stats is None:
+            reconcile_stats()
+            stats = mongo.db.admin_stats.find_one({'_id': STATS_ID})
         
-        # Get recent booking counts by status
-        booking_stats = list(mongo.db.bookings.aggregate([
+        return jsonify(_stats_view(stats)), 200
+    
+    except Exception as e:
+        return jsonify({'message': 'Failed to fetch statistics', 'error': str(e)}), 500
+
+# Revenue/bookings/guests per day from daily_rollups (?from=&to=&package_id=)
+@api.route('/api/admin/stats/timeseries', methods=['GET'])
+@token_required
+@admin_required
+def get_stats_timeseries(current_user):
+    try:
+        today = rollup_day(datetime.utcnow())
+        end = datetime.strptime(request.args['to'], BOOKING_DATE_FORMAT) if request.args.get('to') else today
+        start = (datetime.strptime(request.args['from'], BOOKING_DATE_FORMAT) if request.args.get('from')
+                 else end - timedelta(days=29))
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    if end < start:
+        return jsonify({'message': 'to must not be before from'}), 400
+    days = (end - start).days + 1
+    if days > current_app.config['TIMESERIES_MAX_DAYS']:
+        return jsonify({'message': f"At most {current_app.config['TIMESERIES_MAX_DAYS']} days per request"}), 400
+    
+    match = {'date': {'$gte': start, '$lte': end}}
+    if request.args.get('package_id'):
+        match['package_id'] = to_object_id(request.args['package_id'])
+        if match['package_id'] is None:
+            return jsonify({'message': 'Invalid package_id'}), 400
+    
+    try:
+        rows = mongo.db.daily_rollups.aggregate([
+            {'$match': match},
             {'$group': {
-                '_id': '$status',
-                'count': {'$sum': 1}
+                '_id': '$date',
+                'revenue': {'$sum': '$revenue'},
+                'bookings': {'$sum': '$bookings'},
+                'guests': {'$sum': '$guests'}
             }}
-        ]))
-        
-        status_counts = {item['_id']: item['count'] for item in booking_stats}
+        ])
+        by_day = {row['_id']: row for row in rows}
+        
+        series = []
+        totals = {'revenue': 0, 'bookings': 0, 'guests': 0}
+        for n in range(days):
+            day = start + timedelta(days=n)
+            row = by_day.get(day, {})
+            point = {field: row.get(field, 0) for field in totals}
+            for field, value in point.items():
+                totals[field] += value
+            series.append(dict(point, date=day.strftime(BOOKING_DATE_FORMAT)))
         
         return jsonify({
-            'totalUsers': total_users,
-            'totalBookings': total_bookings,
-            'activePackages': active_packages,
-            'totalRevenue': total_revenue,
-            'bookingStats': status_counts
+            'from': start.strftime(BOOKING_DATE_FORMAT),
+            'to': end.strftime(BOOKING_DATE_FORMAT),
+            'package_id': match.get('package_id'),
+            'series': series,
+            'totals': totals
         }), 200
     
     except Exception as e:
         return jsonify({'message': 'Failed to fetch statistics', 'error': str(e)}), 500
 
+# Daily operations manifest: who arrives and who leaves in a date window
+@api.route('/api/admin/manifest', methods=['GET'])
+@token_required
+@admin_required
+def get_manifest(current_user):
+    try:
+        start = datetime.strptime(request.args.get('from') or datetime.utcnow().strftime(BOOKING_DATE_FORMAT), BOOKING_DATE_FORMAT)
+        end = datetime.strptime(request.args['to'], BOOKING_DATE_FORMAT) if request.args.get('to') else start
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    if end < start:
+        return jsonify({'message': 'to must not be before from'}), 400
+    if (end - start).days >= current_app.config['MANIFEST_MAX_DAYS']:
+        return jsonify({'message': f"At most {current_app.config['MANIFEST_MAX_DAYS']} days per manifest"}), 400
+    
+    try:
+        window = {'$gte': start, '$lt': end + timedelta(days=1)}
+        manifest = {
+            'from': start.strftime(BOOKING_DATE_FORMAT),
+            'to': end.strftime(BOOKING_DATE_FORMAT)
+        }
+        for kind, field in (('arrivals', 'check_in'), ('departures', 'check_out')):
+            bookings = list(mongo.db.bookings.find(
+                {field: window, 'status': {'$ne': 'cancelled'}}
+            ).sort([(field, ASCENDING), ('_id', ASCENDING)]))
+            manifest[kind] = attach_booking_details(bookings, include_user=True)
+        
+        return jsonify(manifest), 200
+    
+    except Exception as e:
+        return jsonify({'message': 'Failed to build manifest', 'error': str(e)}), 500
+
+# Admin exports: CSV or NDJSON streamed from a projected server-side cursor
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+BOOKING_EXPORT_COLUMNS = [
+    '_id', 'user_id', 'user_name', 'user_email', 'package_id', 'package_name', 'destination',
+    'guests', 'check_in', 'check_out', 'status', 'created_at'
+]
+BOOKING_EXPORT_PROJECTION = {
+    field: 1 for field in ['user_id', 'package_id', 'destination', 'guests', 'check_in', 'check_out', 'status', 'created_at']
+}
+USER_EXPORT_COLUMNS = ['_id', 'name', 'email', 'role', 'created_at']
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return '' if value is None else str(value)
+
+def stream_export(cursor, fmt, columns, filename, transform=None):
+    cursor = cursor.batch_size(current_app.config['STREAM_BATCH_SIZE'])
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == 'csv':
+            writer.writerow(columns)
+        for batch in iter_batches(cursor, current_app.config['STREAM_BATCH_SIZE']):
+            if transform:
+                batch = transform(batch)
+            if fmt == 'csv':
+                writer.writerows([_export_value(row.get(column)) for column in columns] for row in batch)
+            else:
+                for row in batch:
+                    buffer.write(current_app.json.dumps({column: row.get(column) for column in columns}) + '\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    return response
+
+def export_format():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    return fmt
+
+# ?from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive) on a datetime field
+def date_range_filter(field):
+    bounds = {}
+    try:
+        if request.args.get('from'):
+            bounds['$gte'] = datetime.strptime(request.args['from'], '%Y-%m-%d')
+        if request.args.get('to'):
+            bounds['$lt'] = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        raise ValueError('Invalid date format. Use YYYY-MM-DD')
+    return {field: bounds} if bounds else {}
+
+def _flatten_booking_rows(batch):
+    attach_booking_details(batch, include_user=True)
+    for booking in batch:
+        package = booking.pop('package', None) or {}
+        user = booking.pop('user', None) or {}
+        booking['package_name'] = package.get('name')
+        booking['user_name'] = user.get('name')
+        booking['user_email'] = user.get('email')
+    return batch
+
+@api.route('/api/admin/export/bookings', methods=['GET'])
+@token_required
+@admin_required
+def export_bookings(current_user):
+    try:
+        fmt = export_format()
+        query = date_range_filter('created_at')
+        if request.args.get('status'):
+            query['status'] = {'$in': request.args['status'].split(',')}
+        
+        cursor = mongo.db.bookings.find(query, BOOKING_EXPORT_PROJECTION).sort(PAGE_SORT)
+        return stream_export(cursor, fmt, BOOKING_EXPORT_COLUMNS, 'bookings', _flatten_booking_rows)
+    
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': 'Failed to export bookings', 'error': str(e)}), 500
+
+@api.route('/api/admin/export/users', methods=['GET'])
+@token_required
+@admin_required
+def export_users(current_user):
+    try:
+        fmt = export_format()
+        query = date_range_filter('created_at')
+        if request.args.get('role'):
+            query['role'] = {'$in': request.args['role'].split(',')}
+        
+        cursor = mongo.db.users.find(query, {column: 1 for column in USER_EXPORT_COLUMNS}).sort(PAGE_SORT)
+        return stream_export(cursor, fmt, USER_EXPORT_COLUMNS, 'users')
+    
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': 'Failed to export users', 'error': str(e)}), 500
+
 # Settings Routes
-@app.route('/api/settings', methods=['GET'])
+@api.route('/api/settings', methods=['GET'])
 @token_required
 @admin_required
 def get_settings(current_user):
     try:
-        settings = mongo.db.settings.find_one({}) or {}
-        return jsonify(serialize_doc(settings)), 200
+        return settings_cache.get().response()
     
     except Exception as e:
         return jsonify({'message': 'Failed to fetch settings', 'error': str(e)}), 500
 
-@app.route('/api/settings', methods=['POST'])
+@api.route('/api/settings', methods=['POST'])
 @token_required
 @admin_required
 def update_settings(current_user):
@@ -566,24 +2212,28 @@ def update_settings(current_user):
         if not data:
             return jsonify({'message': 'No data provided'}), 400
         
-        # Add timestamp
+        # The version is maintained here; other workers compare it to detect changes
+        data.pop('_id', None)
+        data.pop('version', None)
         data['updated_at'] = datetime.utcnow()
         data['updated_by'] = str(current_user['_id'])
         
         # Update settings (upsert)
-        mongo.db.settings.update_one(
+        settings = mongo.db.settings.find_one_and_update(
             {},
-            {'$set': data},
-            upsert=True
+            {'$set': data, '$inc': {'version': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
         )
+        settings_cache.store(settings)
         
-        return jsonify({'message': 'Settings updated successfully'}), 200
+        return jsonify({'message': 'Settings updated successfully', 'version': settings['version']}), 200
     
     except Exception as e:
         return jsonify({'message': 'Failed to update settings', 'error': str(e)}), 500
 
 # Database Seed Route
-@app.route('/api/seed', methods=['POST'])
+@api.route('/api/seed', methods=['POST'])
 def seed_data():
     try:
         # Check if data already exists
@@ -594,7 +2244,7 @@ def seed_data():
         admin_user = {
             'name': 'Admin User',
             'email': 'admin@example.com',
-            'password': generate_password_hash('admin123'),
+            'password': hash_password('admin123'),
             'role': 'admin',
             'created_at': datetime.utcnow()
         }
@@ -604,7 +2254,7 @@ def seed_data():
         test_user = {
             'name': 'Test User',
             'email': 'user@example.com',
-            'password': generate_password_hash('user123'),
+            'password': hash_password('user123'),
             'role': 'user',
             'created_at': datetime.utcnow()
         }
@@ -717,6 +2367,7 @@ def seed_data():
         ]
         
         mongo.db.packages.insert_many(sample_packages)
+        invalidate_catalog()
         
         # Create sample bookings
         packages = list(mongo.db.packages.find())
@@ -724,22 +2375,26 @@ def seed_data():
         
         sample_bookings = [
             {
-                'user_id': str(users[1]['_id']),  # Test user
-                'package_id': str(packages[0]['_id']),
+                'user_id': users[1]['_id'],  # Test user
+                'package_id': packages[0]['_id'],
                 'destination': packages[0]['name'],
                 'guests': 2,
-                'check_in': '2024-07-15',
-                'check_out': '2024-07-22',
+                'price': packages[0]['price'],
+                'currency': current_app.config['CURRENCY'],
+                'check_in': datetime(2024, 7, 15),
+                'check_out': datetime(2024, 7, 22),
                 'status': 'confirmed',
                 'created_at': datetime.utcnow() - timedelta(days=5)
             },
             {
-                'user_id': str(users[1]['_id']),  # Test user
-                'package_id': str(packages[1]['_id']),
+                'user_id': users[1]['_id'],  # Test user
+                'package_id': packages[1]['_id'],
                 'destination': packages[1]['name'],
                 'guests': 1,
-                'check_in': '2024-08-01',
-                'check_out': '2024-08-05',
+                'price': packages[1]['price'],
+                'currency': current_app.config['CURRENCY'],
+                'check_in': datetime(2024, 8, 1),
+                'check_out': datetime(2024, 8, 5),
                 'status': 'pending',
                 'created_at': datetime.utcnow() - timedelta(days=2)
             }
@@ -759,9 +2414,13 @@ def seed_data():
                 'twitter': 'https://twitter.com/travelexplorer',
                 'instagram': 'https://instagram.com/travelexplorer'
             },
-            'created_at': datetime.utcnow()
+            'created_at': datetime.utcnow(),
+            'version': 1
         }
         mongo.db.settings.insert_one(settings)
+        settings_cache.store(settings)
+        reconcile_stats()
+        rebuild_rollups()
         
         return jsonify({
             'message': 'Database seeded successfully',
@@ -780,7 +2439,7 @@ def seed_data():
         return jsonify({'message': 'Failed to seed database', 'error': str(e)}), 500
 
 # Clear database route (for development)
-@app.route('/api/clear-db', methods=['DELETE'])
+@api.route('/api/clear-db', methods=['DELETE'])
 def clear_database():
     try:
         # Only allow in development mode
@@ -792,6 +2451,14 @@ def clear_database():
         mongo.db.packages.delete_many({})
         mongo.db.bookings.delete_many({})
         mongo.db.settings.delete_many({})
+        mongo.db.admin_stats.delete_many({})
+        mongo.db.availability.delete_many({})
+        mongo.db.daily_rollups.delete_many({})
+        mongo.db.principal_revocations.delete_many({})
+        settings_cache.refresh()
+        invalidate_catalog()
+        principal_cache.clear()
+        token_cache.clear()
         
         return jsonify({'message': 'Database cleared successfully'}), 200
     
@@ -799,7 +2466,7 @@ def clear_database():
         return jsonify({'message': 'Failed to clear database', 'error': str(e)}), 500
 
 # Health check route
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
     try:
         # Test database connection
@@ -807,6 +2474,12 @@ def health_check():
         return jsonify({
             'status': 'healthy',
             'database': 'connected',
+            'cache': {
+                'packages': package_cache.stats(),
+                'search': search_cache.stats(),
+                'principals': principal_cache.stats(),
+                'tokens': token_cache.stats()
+            },
             'timestamp': datetime.utcnow().isoformat()
         }), 200
     except Exception as e:
@@ -817,20 +2490,399 @@ def health_check():
             'timestamp': datetime.utcnow().isoformat()
         }), 500
 
+@api.route('/api/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# Database indexes: one entry per query pattern the app issues
+INDEXES = {
+    'users': [
+        ([('email', ASCENDING)], {'unique': True, 'name': 'email_unique'}),
+        ([('created_at', DESCENDING), ('_id', DESCENDING)], {'name': 'created_at_id'})
+    ],
+    'bookings': [
+        ([('user_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {'name': 'user_created_at'}),
+        ([('created_at', DESCENDING), ('_id', DESCENDING)], {'name': 'created_at_id'}),
+        ([('status', ASCENDING)], {'name': 'status'}),
+        ([('package_id', ASCENDING)], {'name': 'package_id'}),
+        ([('check_in', ASCENDING)], {'name': 'check_in'}),
+        ([('check_out', ASCENDING)], {'name': 'check_out'})
+    ],
+    'availability': [
+        ([('package_id', ASCENDING), ('date', ASCENDING)], {'unique': True, 'name': 'package_date_unique'})
+    ],
+    'principal_revocations': [
+        # Revocations only matter while an entry could still be cached somewhere
+        ([('revoked_at', ASCENDING)], {'name': 'revoked_at_ttl', 'expireAfterSeconds': 3600})
+    ],
+    'daily_rollups': [
+        ([('date', ASCENDING), ('package_id', ASCENDING)], {'unique': True, 'name': 'date_package_unique'})
+    ],
+    'packages': [
+        ([('created_at', DESCENDING), ('_id', DESCENDING)], {'name': 'created_at_id'}),
+        ([('name', TEXT), ('description', TEXT), ('features', TEXT)], {
+            'name': 'catalog_text',
+            'weights': {'name': 10, 'features': 3, 'description': 1}
+        }),
+        ([('price', ASCENDING)], {'name': 'price'}),
+        ([('discount', ASCENDING)], {'name': 'discount'})
+    ]
+}
+
+def ensure_indexes():
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            mongo.db[collection].create_index(keys, **options)
+            current_app.logger.info('Ensured index %s.%s', collection, options['name'])
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+# Explain each hot query and report whether its winning plan uses an index scan
+def check_query_plans():
+    probe = ObjectId()
+    queries = {
+        'login/register by email': mongo.db.users.find({'email': 'probe@example.com'}),
+        'bookings by user': mongo.db.bookings.find({'user_id': probe}).sort(PAGE_SORT),
+        'bookings by status': mongo.db.bookings.find({'status': 'completed'}),
+        'bookings by package': mongo.db.bookings.find({'package_id': probe}),
+        'arrivals by date': mongo.db.bookings.find({'check_in': {'$gte': datetime(2000, 1, 1)}, 'status': {'$ne': 'cancelled'}}),
+        'departures by date': mongo.db.bookings.find({'check_out': {'$gte': datetime(2000, 1, 1)}, 'status': {'$ne': 'cancelled'}})
+    }
+    results = {}
+    for name, cursor in queries.items():
+        winning_plan = cursor.explain()['queryPlanner']['winningPlan']
+        results[name] = 'IXSCAN' in set(_plan_stages(winning_plan))
+    return results
+
+@api.cli.command('ensure-indexes')
+@click.option('--check', is_flag=True, help='Verify with explain() that hot queries use an IXSCAN.')
+def ensure_indexes_command(check):
+    """Create the MongoDB indexes the API relies on."""
+    ensure_indexes()
+    click.echo('Indexes ensured')
+    if check:
+        failures = 0
+        for name, uses_index in check_query_plans().items():
+            click.echo(f"{'IXSCAN' if uses_index else 'COLLSCAN':8} {name}")
+            failures += not uses_index
+        if failures:
+            raise click.ClickException(f'{failures} query pattern(s) not using an index')
+
+@api.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Recompute the materialized admin statistics and report any drift."""
+    drift = reconcile_stats()
+    click.echo(f'Drift corrected: {drift}' if drift else 'Admin stats in sync')
+
+@api.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Backfill booked prices and rebuild the daily revenue rollups from scratch."""
+    backfilled, rollups = rebuild_rollups()
+    click.echo(f'Backfilled prices on {backfilled} bookings; {rollups} daily rollups written')
+
+@api.cli.command('sweep-bookings')
+def sweep_bookings_command():
+    """Complete confirmed bookings whose check-out date has passed."""
+    click.echo(f'Completed {complete_past_bookings()} bookings')
+
+@api.cli.command('migrate-booking-dates')
+@click.option('--batch-size', default=1000, show_default=True, help='Documents per bulk_write call.')
+def migrate_booking_dates_command(batch_size):
+    """Convert check_in/check_out strings on existing bookings to BSON dates."""
+    query = {'$or': [{field: {'$type': 'string'}} for field in BOOKING_DATE_FIELDS]}
+    cursor = mongo.db.bookings.find(query, {field: 1 for field in BOOKING_DATE_FIELDS}).batch_size(batch_size)
+    migrated, invalid = 0, 0
+    for batch in iter_batches(cursor, batch_size):
+        updates = []
+        for booking in batch:
+            try:
+                dates = {field: parse_booking_date(booking[field]) for field in BOOKING_DATE_FIELDS}
+            except (KeyError, TypeError, ValueError):
+                invalid += 1
+                continue
+            # Match the old values so a concurrent write is never overwritten
+            updates.append(UpdateOne(
+                {'_id': booking['_id'], **{field: booking[field] for field in BOOKING_DATE_FIELDS}},
+                {'$set': dates}
+            ))
+        if updates:
+            migrated += mongo.db.bookings.bulk_write(updates, ordered=False).modified_count
+    click.echo(f'Migrated {migrated} bookings' + (f'; {invalid} with unparseable dates left as-is' if invalid else ''))
+
+@api.cli.command('migrate-object-ids')
+@click.option('--batch-size', default=1000, show_default=True, help='Documents per bulk_write call.')
+def migrate_object_ids_command(batch_size):
+    """Convert string user_id/package_id references on bookings and availability to ObjectIds."""
+    for collection, fields in (('bookings', ('user_id', 'package_id')), ('availability', ('package_id',))):
+        query = {'$or': [{field: {'$type': 'string'}} for field in fields]}
+        cursor = mongo.db[collection].find(query, {field: 1 for field in fields}).batch_size(batch_size)
+        migrated, invalid, conflicts = 0, 0, 0
+        for batch in iter_batches(cursor, batch_size):
+            updates = []
+            for doc in batch:
+                refs = {field: to_object_id(doc[field]) for field in fields if isinstance(doc.get(field), str)}
+                if None in refs.values():
+                    invalid += 1
+                    refs = {field: ref for field, ref in refs.items() if ref is not None}
+                    if not refs:
+                        continue
+                # Match the old values so a concurrent write is never overwritten
+                updates.append(UpdateOne({'_id': doc['_id'], **{field: doc[field] for field in refs}}, {'$set': refs}))
+            if not updates:
+                continue
+            try:
+                migrated += mongo.db[collection].bulk_write(updates, ordered=False).modified_count
+            except BulkWriteError as e:
+                # An availability night already written under the ObjectId key
+                migrated += e.details['nModified']
+                conflicts += len(e.details['writeErrors'])
+        click.echo(f'{collection}: migrated {migrated}'
+                   + (f', {invalid} with invalid references left as-is' if invalid else '')
+                   + (f', {conflicts} duplicate keys left as-is' if conflicts else ''))
+
+# Synthetic data for capacity testing. Generation runs in worker processes;
+# the parent streams each chunk into MongoDB with insert_many.
+SYNTHETIC_EMAIL = 'user{}@synthetic.example.com'
+SYNTHETIC_DESTINATIONS = ['Tropical Paradise', 'Mountain Retreat', 'European Adventure',
+                          'Desert Safari', 'City Explorer', 'Island Hopping']
+_synthetic_refs = {}
+
+def _init_synthetic_worker(user_ids, package_refs):
+    # Sent once per worker process instead of once per chunk
+    _synthetic_refs['users'] = user_ids
+    _synthetic_refs['packages'] = package_refs
+
+def _synthetic_users(start, count, password_hash, seed):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    return [{
+        '_id': ObjectId(),
+        'name': f'Synthetic User {i}',
+        'email': SYNTHETIC_EMAIL.format(i),
+        'password': password_hash,
+        'role': 'user',
+        'created_at': now - timedelta(minutes=rng.randrange(2 * 525600))
+    } for i in range(start, start + count)]
+
+def _synthetic_packages(start, count, seed):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    packages = []
+    for i in range(start, start + count):
+        original = round(rng.lognormvariate(7.0, 0.45), -1)
+        discount = rng.choice([0, 5, 10, 15, 17, 18, 19, 20, 25, 30])
+        packages.append({
+            '_id': ObjectId(),
+            'name': f'{SYNTHETIC_DESTINATIONS[i % len(SYNTHETIC_DESTINATIONS)]} {i}',
+            'description': 'Synthetic package generated for capacity testing.',
+            'price': round(original * (100 - discount) / 100),
+            'originalPrice': original,
+            'discount': discount,
+            'image': 'https://images.unsplash.com/photo-1540202404-1b927e27fa8b?ixlib=rb-4.0.3&auto=format&fit=crop&w=675&q=80',
+            'features': [f'{rng.randint(3, 10)} days of travel', 'Accommodation included', 'Guided tours'],
+            'created_at': now - timedelta(days=rng.randrange(730))
+        })
+    return packages
+
+def _synthetic_bookings(start, count, seed):
+    rng = random.Random(seed)
+    users, packages = _synthetic_refs['users'], _synthetic_refs['packages']
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    bookings = []
+    for _ in range(count):
+        # Skewed popularity: half the bookings come from a long tail of repeat
+        # customers, and a few best-selling packages take most of the volume
+        if rng.random() < 0.5:
+            user_id = users[min(int(rng.paretovariate(1.2)) - 1, len(users) - 1)]
+        else:
+            user_id = rng.choice(users)
+        package_id, destination, price = packages[min(int(rng.paretovariate(1.5)) - 1, len(packages) - 1)]
+        created_at = today - timedelta(days=rng.randrange(365), minutes=rng.randrange(1440))
+        check_in = created_at.replace(hour=0, minute=0) + timedelta(days=rng.randint(1, 120))
+        check_out = check_in + timedelta(days=rng.choice([2, 3, 4, 5, 7, 7, 10, 14]))
+        if check_out < today:
+            status = rng.choices(['completed', 'cancelled'], [9, 1])[0]
+        else:
+            status = rng.choices(['pending', 'confirmed', 'cancelled'], [3, 6, 1])[0]
+        bookings.append({
+            'user_id': user_id,
+            'package_id': package_id,
+            'destination': destination,
+            'guests': rng.choices([1, 2, 3, 4, 5, 6], [15, 45, 15, 15, 5, 5])[0],
+            'price': price,
+            'currency': Config.CURRENCY,
+            'check_in': check_in,
+            'check_out': check_out,
+            'status': status,
+            'created_at': created_at,
+            'updated_at': created_at
+        })
+    return bookings
+
+def _stream_chunks(pool, window, fn, total, batch_size, seed, *args):
+    # Keep a bounded number of chunks in flight so memory stays flat at any N
+    pending = []
+    for start in range(0, total, batch_size):
+        pending.append(pool.submit(fn, start, min(batch_size, total - start), *args, seed + start))
+        if len(pending) >= window:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+def generate_dataset(users, packages, bookings, batch_size=5000, workers=None, password='password123', seed=0):
+    """Generate and insert synthetic users, packages and bookings; returns rows/sec per collection."""
+    report = {}
+    workers = workers or os.cpu_count() or 1
+    window = workers * 2
+    password_hash = hash_password(password)  # Hashed once, shared by every synthetic user
+    
+    # Insert chunks as they arrive; returns key(doc) for every inserted document
+    def insert(collection, chunks, key=None):
+        started, rows, keys = time.perf_counter(), 0, []
+        for chunk in chunks:
+            mongo.db[collection].insert_many(chunk, ordered=False)
+            rows += len(chunk)
+            if key:
+                keys.extend(key(doc) for doc in chunk)
+        elapsed = time.perf_counter() - started
+        report[collection] = {
+            'rows': rows,
+            'seconds': round(elapsed, 2),
+            'rows_per_sec': round(rows / elapsed) if elapsed else rows
+        }
+        return keys
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        user_ids = insert('users', _stream_chunks(
+            pool, window, _synthetic_users, users, batch_size, seed, password_hash
+        ), key=lambda doc: doc['_id'])
+        package_refs = insert('packages', _stream_chunks(
+            pool, window, _synthetic_packages, packages, batch_size, seed
+        ), key=lambda doc: (doc['_id'], doc['name'], doc['price']))
+    
+    if bookings and user_ids and package_refs:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_synthetic_worker,
+                                 initargs=(user_ids, package_refs)) as pool:
+            insert('bookings', _stream_chunks(pool, window, _synthetic_bookings, bookings, batch_size, seed))
+    
+    invalidate_catalog()
+    return report
+
+@api.cli.command('generate-data')
+@click.option('--users', default=10000, show_default=True)
+@click.option('--packages', default=100, show_default=True)
+@click.option('--bookings', default=100000, show_default=True)
+@click.option('--batch-size', default=5000, show_default=True, help='Documents per insert_many call.')
+@click.option('--workers', default=None, type=int, help='Generator processes (default: CPU count).')
+@click.option('--password', default='password123', show_default=True, help='Password of every synthetic user.')
+@click.option('--seed', default=0, show_default=True, help='Random seed for reproducible datasets.')
+def generate_data_command(users, packages, bookings, batch_size, workers, password, seed):
+    """Bulk-insert synthetic users, packages and bookings for capacity testing."""
+    started = time.perf_counter()
+    report = generate_dataset(users, packages, bookings, batch_size, workers, password, seed)
+    for collection, result in report.items():
+        click.echo(f"{collection:9} {result['rows']:>10} rows  {result['seconds']:>8}s  {result['rows_per_sec']:>10} rows/s")
+    ensure_indexes()
+    reconcile_stats()
+    rebuild_rollups()
+    click.echo(f'Done in {time.perf_counter() - started:.1f}s; synthetic users log in as '
+               f"{SYNTHETIC_EMAIL.format('<n>')} / {password}")
+
 # Error handlers
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({'message': 'Endpoint not found'}), 404
 
-@app.errorhandler(405)
+@api.app_errorhandler(405)
 def method_not_allowed(error):
     return jsonify({'message': 'Method not allowed'}), 405
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     return jsonify({'message': 'Internal server error'}), 500
 
+# Application factory; call once per process (after fork under gunicorn)
+def create_app(config=None):
+    global password_pool, rate_limit_store
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+    
+    # connect=False defers opening sockets until the first operation, so the
+    # client never shares connections across a fork
+    mongo.init_app(
+        app,
+        maxPoolSize=app.config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=app.config['MONGO_MIN_POOL_SIZE'],
+        maxIdleTimeMS=app.config['MONGO_MAX_IDLE_TIME_MS'],
+        connectTimeoutMS=app.config['MONGO_CONNECT_TIMEOUT_MS'],
+        socketTimeoutMS=app.config['MONGO_SOCKET_TIMEOUT_MS'],
+        serverSelectionTimeoutMS=app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        waitQueueTimeoutMS=app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        readPreference=app.config['MONGO_READ_PREFERENCE'],
+        event_listeners=[db_monitor],
+        connect=False
+    )
+    db_monitor.slow_ms = app.config['SLOW_QUERY_MS']
+    db_monitor.logger = app.logger
+    cors.init_app(app)
+    # After mongo.init_app, which installs its own provider
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(api)
+    
+    # The landing page is static: render and precompress it once
+    with app.app_context():
+        template_path = os.path.join(app.root_path, app.template_folder, 'kayal.html')
+        app.extensions['index_page'] = Representation(
+            render_template('kayal.html').encode(), 'text/html',
+            last_modified=datetime.utcfromtimestamp(int(os.path.getmtime(template_path))),
+            precompress=True
+        )
+    
+    # Caches are process-wide; size them from this app's config
+    package_cache.maxsize, package_cache.ttl = app.config['PACKAGE_CACHE_SIZE'], app.config['PACKAGE_CACHE_TTL']
+    search_cache.maxsize, search_cache.ttl = app.config['SEARCH_CACHE_SIZE'], app.config['PACKAGE_CACHE_TTL']
+    principal_cache.maxsize, principal_cache.ttl = app.config['PRINCIPAL_CACHE_SIZE'], app.config['PRINCIPAL_CACHE_TTL']
+    token_cache.maxsize, token_cache.ttl = app.config['TOKEN_CACHE_SIZE'], app.config['PRINCIPAL_CACHE_TTL']
+    if app.config['RATE_LIMIT_STORAGE_URL']:
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_STORAGE_URL requires the redis package')
+        rate_limit_store = RedisBucketStore(app.config['RATE_LIMIT_STORAGE_URL'])
+    password_pool = ThreadPoolExecutor(
+        max_workers=app.config['PASSWORD_HASH_WORKERS'],
+        thread_name_prefix='password-hash'
+    )
+    jobs.configure(app.config['JOB_WORKERS'])
+    jobs.schedule(reconcile_stats, app.config['STATS_RECONCILE_INTERVAL'])
+    jobs.schedule(complete_past_bookings, app.config['LIFECYCLE_SWEEP_INTERVAL'])
+    jobs.schedule(sync_principal_revocations, app.config['PRINCIPAL_REVOCATION_POLL_INTERVAL'])
+    
+    if app.config['ENSURE_INDEXES_ON_STARTUP']:
+        with app.app_context():
+            try:
+                ensure_indexes()
+            except Exception as e:
+                app.logger.warning('Could not ensure indexes: %s', e)
+    
+    app.logger.info(
+        'pid %s: MongoDB pool min=%s max=%s wait_queue_timeout=%sms read_preference=%s; password hash workers=%s',
+        os.getpid(), app.config['MONGO_MIN_POOL_SIZE'], app.config['MONGO_MAX_POOL_SIZE'],
+        app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'], app.config['MONGO_READ_PREFERENCE'],
+        app.config['PASSWORD_HASH_WORKERS']
+    )
+    return app
+
 if __name__ == '__main__':
     # Set environment variable for development
     os.environ['FLASK_ENV'] = 'development'
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,48 @@
+"""Cooperative serving mode for the Travel Explorer API.
+
+Runs the same Flask app (routes, token_required/admin_required, response
+shapes) on gevent's event loop. PyMongo's socket I/O becomes
+non-blocking once the standard library is monkey-patched, so one process
+keeps hundreds of requests waiting on MongoDB without a thread each.
+
+Usage:
+    python async_server.py
+
+The synchronous mode (python app.py) is unchanged for comparison.
+"""
+from gevent import monkey
+
+# Must run before anything imports socket, ssl or threading (pymongo included)
+monkey.patch_all()
+
+import os
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+from gevent.threadpool import ThreadPoolExecutor
+
+import app as travel_app
+
+
+def main():
+    host = os.environ.get('ASYNC_HOST', '0.0.0.0')
+    port = int(os.environ.get('ASYNC_PORT', 5000))
+    max_connections = int(os.environ.get('ASYNC_MAX_CONNECTIONS', 1000))
+
+    application = travel_app.create_app()
+
+    # Patched threads are greenlets, so CPU-bound password hashing needs real
+    # OS threads or it would stall the event loop for every in-flight request
+    travel_app.password_pool = ThreadPoolExecutor(
+        max_workers=application.config['PASSWORD_HASH_WORKERS']
+    )
+
+    server = WSGIServer((host, port), application, spawn=Pool(max_connections))
+    application.logger.info(
+        'Serving on %s:%s (gevent, max %s concurrent connections)', host, port, max_connections
+    )
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Concurrency stress test for seat reservations: proves nothing is oversold.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017/travel_explorer_stress \
+        python benchmarks/availability_stress.py [--threads 64] [--capacity 10] [--nights 5]
+
+Many threads race to book overlapping ranges on a scratch package. Exits
+non-zero if more seats were handed out than the package has on any night.
+Needs a real mongod; the scratch package and its data are removed after.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+from datetime import datetime, timedelta
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app, mongo, reserve_seats  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--capacity', type=int, default=10)
+    parser.add_argument('--nights', type=int, default=5)
+    parser.add_argument('--attempts', type=int, default=20, help='reservations attempted per thread')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        package_id = mongo.db.packages.insert_one({
+            'name': 'Availability stress test', 'price': 0, 'capacity': args.capacity
+        }).inserted_id
+        start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=30)
+        seats_granted = {start + timedelta(days=n): 0 for n in range(args.nights)}
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.threads)
+
+        def worker():
+            barrier.wait()
+            with app.app_context():
+                for _ in range(args.attempts):
+                    first = random.randrange(args.nights)
+                    last = random.randrange(first, args.nights) + 1
+                    booking = {
+                        'package_id': package_id,
+                        'guests': random.randint(1, 3),
+                        'check_in': (start + timedelta(days=first)).strftime('%Y-%m-%d'),
+                        'check_out': (start + timedelta(days=last)).strftime('%Y-%m-%d'),
+                    }
+                    if reserve_seats(booking):
+                        with lock:
+                            for n in range(first, last):
+                                seats_granted[start + timedelta(days=n)] += booking['guests']
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        oversold = False
+        for night, granted in sorted(seats_granted.items()):
+            bucket = mongo.db.availability.find_one({'package_id': package_id, 'date': night}) or {}
+            remaining = bucket.get('remaining', args.capacity)
+            ok = granted <= args.capacity and granted + remaining == args.capacity
+            oversold |= not ok
+            print(f"{night:%Y-%m-%d}  granted={granted:3}  remaining={remaining:3}  {'ok' if ok else 'OVERSOLD'}")
+
+        mongo.db.availability.delete_many({'package_id': package_id})
+        mongo.db.packages.delete_one({'_id': package_id})
+
+    sys.exit(1 if oversold else 0)
+
+
+if __name__ == '__main__':
+    main()
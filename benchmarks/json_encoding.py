@@ -0,0 +1,85 @@
+"""Encode time for a 10k-booking list response: old conversion path vs FastJSONProvider.
+
+Usage:
+    python benchmarks/json_encoding.py [--docs 10000] [--repeat 20]
+
+Compares:
+  copy+bson      copy each document, stringify _id, encode the rest with
+                 bson.json_util (what the list endpoints used to do)
+  stdlib         FastJSONProvider's fallback (json + native defaults)
+  orjson         FastJSONProvider with orjson, one call for the whole list
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId, json_util
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as travel_app  # noqa: E402
+
+provider = None
+
+
+def make_bookings(count):
+    now = datetime.utcnow()
+    return [{
+        '_id': ObjectId(),
+        'user_id': ObjectId(),
+        'package_id': ObjectId(),
+        'destination': 'Tropical Paradise',
+        'guests': 2,
+        'check_in': '2030-07-15',
+        'check_out': '2030-07-22',
+        'status': 'confirmed',
+        'created_at': now - timedelta(minutes=i),
+        'updated_at': now,
+        'package': {'name': 'Tropical Paradise', 'price': 1299, 'image': 'https://images.unsplash.com/photo'},
+        'user': {'name': 'Test User', 'email': 'user@example.com'},
+    } for i in range(count)]
+
+
+def copy_and_bson(docs):
+    docs = [dict(doc, _id=str(doc['_id'])) for doc in docs]
+    return json.dumps(docs, default=json_util.default).encode()
+
+
+def stdlib(docs):
+    return json.dumps(docs, default=travel_app._json_default, separators=(',', ':')).encode()
+
+
+def fast_provider(docs):
+    return provider.dumps_bytes(docs)
+
+
+def timed(fn, docs, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    global provider
+    provider = travel_app.create_app({'ENSURE_INDEXES_ON_STARTUP': False}).json
+    docs = make_bookings(args.docs)
+    results = {'copy+bson_ms': timed(copy_and_bson, docs, args.repeat),
+               'stdlib_ms': timed(stdlib, docs, args.repeat)}
+    if travel_app.orjson:
+        results['orjson_ms'] = timed(fast_provider, docs, args.repeat)
+    print(json.dumps({'docs': args.docs, 'best_of': args.repeat, **results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""Load test for the main API flows, reported as JSON for comparison between commits.
+
+Usage:
+    # against a local mongod (database is dropped and re-seeded)
+    python benchmarks/load.py --mongo-uri mongodb://localhost:27017/travel_explorer_bench
+
+    # fully in-process, no server needed (requires mongomock)
+    python benchmarks/load.py --in-process --bookings 10000
+
+    # against an already running server seeded by this script
+    python benchmarks/load.py --mongo-uri ... --base-url http://localhost:5000
+
+Requests are issued through Flask's test client unless --base-url is given,
+so the figures cover the app and database, not HTTP parsing. Each scenario
+runs --requests requests spread over --concurrency threads and reports
+p50/p95/p99 latency (ms), throughput (req/s) and errors.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_ROOT)
+
+import app as travel_app  # noqa: E402
+
+PASSWORD = 'bench-password'
+ADMIN_EMAIL = 'bench-admin@example.com'
+
+
+def seed(db, users, packages, bookings, batch_size, workers):
+    """Reset the database and fill it with synthetic data via generate_dataset."""
+    for name in ('users', 'packages', 'bookings', 'admin_stats', 'availability', 'daily_rollups'):
+        db[name].delete_many({})
+    db.users.insert_one({'name': 'Bench Admin', 'email': ADMIN_EMAIL, 'password': travel_app.hash_password(PASSWORD),
+                         'role': 'admin', 'created_at': datetime.utcnow()})
+    return travel_app.generate_dataset(users, packages, bookings, batch_size, workers, password=PASSWORD, seed=42)
+
+
+class Client:
+    """Minimal JSON client over Flask's test client or real HTTP."""
+
+    def __init__(self, flask_app=None, base_url=None):
+        self.flask_app = flask_app
+        self.base_url = base_url
+
+    def request(self, method, path, token=None, body=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        if self.base_url is None:
+            response = self.flask_app.test_client().open(path, method=method, headers=headers, json=body)
+            return response.status_code, response.get_json(silent=True)
+        data = json.dumps(body).encode() if body is not None else None
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index] * 1000, 3)
+
+
+def run_scenario(call, requests, concurrency):
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            ok = call(i)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests': requests,
+        'errors': sum(1 for _, ok in results if not ok),
+        'throughput_rps': round(requests / wall, 2),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    backend = parser.add_mutually_exclusive_group(required=True)
+    backend.add_argument('--mongo-uri', help='local mongod database to seed and test against')
+    backend.add_argument('--in-process', action='store_true', help='use mongomock instead of a server')
+    parser.add_argument('--base-url', help='drive a running server over HTTP instead of the test client')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--packages', type=int, default=60)
+    parser.add_argument('--bookings', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed-workers', type=int, help='data generator processes (default: CPU count)')
+    parser.add_argument('--no-seed', action='store_true', help='reuse data seeded by an earlier run')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--login-requests', type=int, default=50, help='logins are CPU-bound by design')
+    parser.add_argument('--admin-limit', type=int, default=100,
+                        help='page size for the admin bookings scenario; 0 fetches the full list')
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    args = parser.parse_args()
+
+    config = {'ENSURE_INDEXES_ON_STARTUP': False, 'STATS_RECONCILE_INTERVAL': 0, 'RATE_LIMIT_ENABLED': False,
+              'LIFECYCLE_SWEEP_INTERVAL': 0}
+    if args.mongo_uri:
+        config['MONGO_URI'] = args.mongo_uri
+    flask_app = travel_app.create_app(config)
+    if args.in_process:
+        import mongomock
+        client = mongomock.MongoClient()
+        travel_app.mongo.cx, travel_app.mongo.db = client, client['travel_explorer_bench']
+    db = travel_app.mongo.db
+
+    with flask_app.app_context():
+        if not args.no_seed:
+            started = time.perf_counter()
+            seeded = seed(db, args.users, args.packages, args.bookings, args.batch_size, args.seed_workers)
+            print(f'Seeded in {time.perf_counter() - started:.1f}s: {seeded}', file=sys.stderr)
+        for step in (travel_app.ensure_indexes, travel_app.reconcile_stats, travel_app.rebuild_rollups):
+            try:
+                step()
+            except Exception as e:
+                print(f'{step.__name__} skipped: {e}', file=sys.stderr)
+
+    client = Client(flask_app, args.base_url)
+    _, body = client.request('POST', '/api/auth/login', body={'email': ADMIN_EMAIL, 'password': PASSWORD})
+    admin_token = body['token']
+    user_tokens = []
+    for i in range(min(args.concurrency, args.users)):
+        _, body = client.request('POST', '/api/auth/login',
+                                 body={'email': travel_app.SYNTHETIC_EMAIL.format(i), 'password': PASSWORD})
+        user_tokens.append(body['token'])
+    package_ids = [str(p['_id']) for p in db.packages.find({}, {'_id': 1}).limit(100)]
+    check_in = datetime.utcnow() + timedelta(days=30)
+    admin_bookings = '/api/bookings?all=true' + (f'&limit={args.admin_limit}' if args.admin_limit else '')
+
+    def ok(status):
+        return 200 <= status < 300
+
+    scenarios = {
+        'login': (args.login_requests, lambda i: ok(client.request('POST', '/api/auth/login', body={
+            'email': travel_app.SYNTHETIC_EMAIL.format(i % max(args.users, 1)), 'password': PASSWORD})[0])),
+        'list_packages': (args.requests, lambda i: ok(client.request('GET', '/api/packages')[0])),
+        'create_booking': (args.requests, lambda i: ok(client.request(
+            'POST', '/api/bookings', token=user_tokens[i % len(user_tokens)], body={
+                'package_id': package_ids[i % len(package_ids)],
+                'destination': 'Load test',
+                'guests': 2,
+                'check_in': check_in.strftime('%Y-%m-%d'),
+                'check_out': (check_in + timedelta(days=3)).strftime('%Y-%m-%d'),
+            })[0])),
+        'admin_bookings': (args.requests, lambda i: ok(client.request('GET', admin_bookings, token=admin_token)[0])),
+        'admin_stats': (args.requests, lambda i: ok(client.request('GET', '/api/admin/stats', token=admin_token)[0])),
+    }
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'backend': 'mongomock' if args.in_process else 'mongod',
+            'transport': 'http' if args.base_url else 'test-client',
+            'scale': {'users': args.users, 'packages': args.packages, 'bookings': args.bookings},
+            'concurrency': args.concurrency,
+            'password_hash_method': flask_app.config['PASSWORD_HASH_METHOD'],
+        },
+        'scenarios': {},
+    }
+    for name, (requests, call) in scenarios.items():
+        report['scenarios'][name] = run_scenario(call, requests, args.concurrency)
+        print(f'{name}: {report["scenarios"][name]}', file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Login hashing throughput per core for a set of Werkzeug hash settings.
+
+Usage:
+    python benchmarks/password_hashing.py [--seconds 3] [METHOD ...]
+
+Each setting is timed on a single thread, so the figure is logins/sec per
+core; multiply by PASSWORD_HASH_WORKERS for the pool's ceiling.
+"""
+import argparse
+import json
+import time
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHODS = [
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+]
+
+
+def bench(method, seconds):
+    password_hash = generate_password_hash('benchmark-password', method=method)
+    logins = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        check_password_hash(password_hash, 'benchmark-password')
+        logins += 1
+    elapsed = time.perf_counter() - start
+    return {
+        'method': method,
+        'logins_per_sec_per_core': round(logins / elapsed, 2),
+        'ms_per_login': round(elapsed / logins * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('methods', nargs='*', default=DEFAULT_METHODS)
+    parser.add_argument('--seconds', type=float, default=3.0, help='time spent on each setting')
+    args = parser.parse_args()
+
+    print(json.dumps([bench(method, args.seconds) for method in args.methods], indent=2))
+
+
+if __name__ == '__main__':
+    main()
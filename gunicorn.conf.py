@@ -0,0 +1,30 @@
+"""Gunicorn settings for the Travel Explorer API, read from the environment.
+
+Keep MONGO_MAX_POOL_SIZE >= GUNICORN_THREADS so a worker's threads never
+queue for a MongoDB connection.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# The MongoDB client must be created in each worker, after fork
+preload_app = False
+accesslog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def when_ready(server):
+    server.log.info(
+        'Concurrency: %s workers x %s threads (%s), bind=%s, timeout=%ss',
+        workers, threads, worker_class, bind, timeout
+    )
@@ -0,0 +1,55 @@
+"""Shared fixtures: the app wired to an in-memory mongomock database.
+
+Runs without a MongoDB server (pip install mongomock pytest).
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import jwt
+import mongomock
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as travel_app  # noqa: E402
+
+
+@pytest.fixture
+def flask_app(monkeypatch):
+    # pymongo 4.9+ passes sort= to bulk update builders; older mongomock does not accept it
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    monkeypatch.setattr(
+        mongomock.collection.BulkOperationBuilder, 'add_update',
+        lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+    )
+    flask_app = travel_app.create_app({
+        'ENSURE_INDEXES_ON_STARTUP': False,
+        'STATS_RECONCILE_INTERVAL': 0,
+        'LIFECYCLE_SWEEP_INTERVAL': 0,
+        'SETTINGS_POLL_INTERVAL': 0,
+        'PRINCIPAL_REVOCATION_POLL_INTERVAL': 0,
+        'JOB_WORKERS': 0,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'
+    })
+    client = mongomock.MongoClient()
+    travel_app.mongo.cx, travel_app.mongo.db = client, client['travel_explorer_test']
+    with flask_app.app_context():
+        yield flask_app
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+def auth_headers(role='user'):
+    """Insert a user with the given role and return a bearer header for it."""
+    user_id = travel_app.mongo.db.users.insert_one({
+        'name': role.title(), 'email': f'{role}-{travel_app.ObjectId()}@example.com', 'role': role,
+        'created_at': datetime.utcnow()
+    }).inserted_id
+    token = jwt.encode({
+        'user_id': str(user_id),
+        'exp': datetime.utcnow() + timedelta(hours=1)
+    }, travel_app.current_app.config['SECRET_KEY'], algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
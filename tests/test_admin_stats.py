@@ -0,0 +1,34 @@
+"""Materialized admin statistics must match the data even when writes arrive
+before the stats document has ever been built."""
+from datetime import datetime
+
+import app as travel_app
+from conftest import auth_headers
+
+
+def register(client, email):
+    return client.post('/api/auth/register', json={'name': 'New', 'email': email, 'password': 'secret123'})
+
+
+def test_write_before_first_reconcile_does_not_create_partial_stats(client):
+    db = travel_app.mongo.db
+    # Existing deployment: data is there but admin_stats has never been built
+    package_ids = db.packages.insert_many([{'name': f'Package {i}', 'price': 100} for i in range(3)]).inserted_ids
+    db.bookings.insert_many([
+        {'package_id': package_id, 'status': 'completed', 'price': 100, 'guests': 1, 'created_at': datetime(2030, 1, 1)}
+        for package_id in package_ids[:2]
+    ])
+    headers = auth_headers('admin')
+
+    assert register(client, 'first@example.com').status_code == 201
+    assert db.admin_stats.find_one({'_id': travel_app.STATS_ID}) is None
+
+    stats = client.get('/api/admin/stats', headers=headers).get_json()
+    assert stats['totalUsers'] == 2
+    assert stats['totalBookings'] == 2
+    assert stats['activePackages'] == 3
+    assert stats['totalRevenue'] == 200
+
+    # Once built, writes keep it current
+    assert register(client, 'second@example.com').status_code == 201
+    assert client.get('/api/admin/stats', headers=headers).get_json()['totalUsers'] == 3
@@ -0,0 +1,82 @@
+"""Seat accounting for packages with a capacity: bookings must never sell more
+seats than the package has on any night."""
+from datetime import datetime, timedelta
+
+import app as travel_app
+from conftest import auth_headers
+
+CHECK_IN = (datetime.utcnow() + timedelta(days=30)).strftime('%Y-%m-%d')
+CHECK_OUT = (datetime.utcnow() + timedelta(days=32)).strftime('%Y-%m-%d')
+
+
+def make_package(capacity=None):
+    return travel_app.mongo.db.packages.insert_one({
+        'name': 'Lakeside', 'price': 100, 'capacity': capacity
+    }).inserted_id
+
+
+def booking_payload(package_id, guests):
+    return {
+        'package_id': str(package_id), 'destination': 'Lakeside', 'guests': guests,
+        'check_in': CHECK_IN, 'check_out': CHECK_OUT
+    }
+
+
+def remaining(package_id):
+    return sorted(doc['remaining'] for doc in travel_app.mongo.db.availability.find({'package_id': package_id}))
+
+
+def test_non_positive_guests_are_rejected(client):
+    headers = auth_headers()
+    package_id = make_package(capacity=2)
+
+    response = client.post('/api/bookings', json=booking_payload(package_id, -5), headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'guests must be a positive integer'
+
+    response = client.post('/api/bookings/bulk', json=[booking_payload(package_id, -5)], headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['results'][0]['message'] == 'guests must be a positive integer'
+
+    # No seats were handed back, so the package still sells exactly its capacity
+    assert client.post('/api/bookings', json=booking_payload(package_id, 2), headers=headers).status_code == 201
+    assert client.post('/api/bookings', json=booking_payload(package_id, 1), headers=headers).status_code == 409
+    assert remaining(package_id) == [0, 0]
+
+
+def test_setting_capacity_counts_existing_bookings(client):
+    admin, user = auth_headers('admin'), auth_headers()
+    package_id = make_package()
+    booking_ids = [
+        client.post('/api/bookings', json=booking_payload(package_id, 2), headers=user).get_json()['_id']
+        for _ in range(2)
+    ]
+
+    response = client.put(f'/api/packages/{package_id}', json={'capacity': 3}, headers=admin)
+    assert response.status_code == 200
+    # Four seats are already sold against three
+    assert remaining(package_id) == [-1, -1]
+    assert client.post('/api/bookings', json=booking_payload(package_id, 1), headers=user).status_code == 409
+
+    # Bookings made while unlimited give their seats back when cancelled
+    response = client.patch(f'/api/bookings/{booking_ids[0]}', json={'status': 'cancelled'}, headers=user)
+    assert response.status_code == 200
+    assert remaining(package_id) == [1, 1]
+    assert client.post('/api/bookings', json=booking_payload(package_id, 1), headers=user).status_code == 201
+    assert remaining(package_id) == [0, 0]
+
+
+def test_null_capacity_removes_the_limit(client):
+    admin, user = auth_headers('admin'), auth_headers()
+    package_id = make_package(capacity=1)
+    assert client.post('/api/bookings', json=booking_payload(package_id, 1), headers=user).status_code == 201
+
+    response = client.put(f'/api/packages/{package_id}', json={'capacity': None}, headers=admin)
+    assert response.status_code == 200
+    assert response.get_json()['capacity'] is None
+    assert remaining(package_id) == []
+    assert client.post('/api/bookings', json=booking_payload(package_id, 5), headers=user).status_code == 201
+
+    # Limiting it again charges both bookings
+    client.put(f'/api/packages/{package_id}', json={'capacity': 10}, headers=admin)
+    assert remaining(package_id) == [4, 4]
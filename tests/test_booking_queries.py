@@ -0,0 +1,66 @@
+"""Round-trip count of booking enrichment: attach_booking_details must issue a
+fixed number of queries however many bookings it is given.
+
+Runs against mongomock (pip install mongomock pytest); no MongoDB server needed.
+"""
+from datetime import datetime
+
+import mongomock
+
+import app as travel_app
+
+
+class QueryCounter:
+    """Counts read commands issued through mongomock collections."""
+    READS = ('find', 'find_one', 'aggregate', 'count_documents')
+
+    def __init__(self, monkeypatch):
+        self.count = 0
+        for name in self.READS:
+            original = getattr(mongomock.collection.Collection, name)
+            monkeypatch.setattr(mongomock.collection.Collection, name, self._counting(original))
+
+    def _counting(self, original):
+        def wrapper(collection, *args, **kwargs):
+            self.count += 1
+            return original(collection, *args, **kwargs)
+        return wrapper
+
+
+def make_bookings(count, users=7, packages=5):
+    db = travel_app.mongo.db
+    user_ids = db.users.insert_many([
+        {'name': f'User {i}', 'email': f'user{i}@example.com', 'role': 'user'} for i in range(users)
+    ]).inserted_ids
+    package_ids = db.packages.insert_many([
+        {'name': f'Package {i}', 'price': 100 * (i + 1), 'image': f'https://example.com/{i}.jpg'} for i in range(packages)
+    ]).inserted_ids
+    return [{
+        '_id': travel_app.ObjectId(),
+        'user_id': user_ids[i % users],
+        'package_id': package_ids[i % packages],
+        'destination': 'Somewhere',
+        'guests': 2,
+        'check_in': datetime(2030, 1, 1),
+        'check_out': datetime(2030, 1, 3),
+        'status': 'pending',
+        'created_at': datetime(2029, 12, 1)
+    } for i in range(count)]
+
+
+def test_attach_booking_details_query_count_is_constant(flask_app, monkeypatch):
+    counts = {}
+    for n in (1, 100):
+        bookings = make_bookings(n)
+        counter = QueryCounter(monkeypatch)
+        enriched = travel_app.attach_booking_details(bookings, include_user=True)
+        counts[n] = counter.count
+        monkeypatch.undo()
+
+        assert all(b['package']['name'].startswith('Package') for b in enriched)
+        assert all(b['user']['email'].endswith('@example.com') for b in enriched)
+        assert enriched[0]['check_in'] == '2030-01-01'
+
+    # One $in query for packages and one for users, regardless of N
+    assert counts[1] == counts[100]
+    assert counts[100] <= 3
@@ -0,0 +1,20 @@
+"""The package list and single packages share one cache; their keys must never collide."""
+import app as travel_app
+
+
+def test_list_is_not_served_for_a_package_id(client):
+    travel_app.mongo.db.packages.insert_one({'name': 'Lakeside', 'price': 100})
+
+    assert len(client.get('/api/packages').get_json()) == 1
+    # 'all' used to be the list's cache key, so this returned the whole catalog once it was warm
+    assert client.get('/api/packages/all').status_code == 404
+    assert client.get('/api/packages/not-an-id').status_code == 404
+
+
+def test_package_is_cached_under_its_id(client):
+    package_id = travel_app.mongo.db.packages.insert_one({'name': 'Lakeside', 'price': 100}).inserted_id
+
+    first = client.get(f'/api/packages/{package_id}')
+    assert first.status_code == 200
+    assert first.get_json()['name'] == 'Lakeside'
+    assert client.get(f'/api/packages/{package_id}', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
@@ -0,0 +1,10 @@
+"""Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app (and its MongoDB client) is created when a worker imports this
+module, i.e. after gunicorn forks, never in the master process.
+"""
+from app import create_app
+
+app = create_app()